@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from metrics import NullMetrics
+from retrieval import HashingEmbedder, tokenize
+
+
+Entry = namedtuple("Entry", ["value", "expires", "row"])
+
+
+class AnswerCache:
+    """Two-level cache of KB answers keyed on (intent, normalized utterance).
+
+    Level one is an exact-match LRU over the normalized text. On a miss
+    the utterance is embedded with a small hashing embedder and compared
+    with every cached query of the same intent in one matrix-vector
+    product; the closest one at or above `threshold` cosine similarity
+    answers for it, so "car won't start, just clicking" reuses the answer
+    computed for "my car won't start it's clicking". The query vectors
+    live in one preallocated float32 matrix with a row per entry.
+
+    Entries expire after `ttl` seconds and the least recently used one is
+    evicted once `max_entries` are held. Everything is dropped when the
+    KB version passed to fetch changes.
+    """
+
+    def __init__(self, max_entries=4096, ttl=3600.0, threshold=0.85, embedder=None,
+                 metrics=None, clock=time.monotonic):
+        self.embedder = embedder or HashingEmbedder(dim=256, char_ngrams=3)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.metrics = metrics or NullMetrics()
+        self.clock = clock
+        self.lock = threading.Lock()
+
+        self.matrix = np.zeros((max_entries, self.embedder.dim), dtype=np.float32)
+        # Intent id per row; -1 marks a free row so it never matches
+        self.row_intents = np.full(max_entries, -1, dtype=np.int32)
+        self.row_keys = [None] * max_entries
+        self.intent_ids = {}
+        self.entries = OrderedDict()
+        self.version = None
+        self._reset()
+
+        self.hits = {"exact": 0, "similar": 0}
+        self.misses = 0
+
+    def _reset(self):
+        self.entries.clear()
+        self.row_intents.fill(-1)
+        self.row_keys = [None] * self.max_entries
+        self.free_rows = list(range(self.max_entries - 1, -1, -1))
+        # Rows at or past high_water have never been used, so the similarity scan stops there
+        self.high_water = 0
+
+    @staticmethod
+    def normalize(utterance):
+        return " ".join(tokenize(utterance))
+
+    def invalidate(self, version=None):
+        """Drop every entry; the next fetch with a different version does this automatically"""
+        with self.lock:
+            had_entries = bool(self.entries)
+            self._reset()
+            self.version = version
+        if had_entries:
+            self.metrics.inc("answer_cache_invalidations_total")
+
+    def _evict(self, key):
+        entry = self.entries.pop(key)
+        self.row_intents[entry.row] = -1
+        self.row_keys[entry.row] = None
+        self.free_rows.append(entry.row)
+
+    def _record(self, result):
+        if result == "miss":
+            self.misses += 1
+        else:
+            self.hits[result] += 1
+        self.metrics.inc("answer_cache_total", result=result)
+
+    def fetch(self, intent, utterance, version, compute):
+        """Return the cached answer for this utterance, or compute(), cache and return it"""
+        if version != self.version:
+            self.invalidate(version)
+        key = (intent, self.normalize(utterance))
+        if not key[1]:
+            return compute()
+
+        now = self.clock()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry.expires > now:
+                    self.entries.move_to_end(key)
+                    self._record("exact")
+                    return entry.value
+                self._evict(key)
+
+        vector = self.embedder.encode([key[1]])[0]
+        with self.lock:
+            intent_id = self.intent_ids.setdefault(intent, len(self.intent_ids))
+            if self.high_water:
+                scores = self.matrix[:self.high_water] @ vector
+                scores[self.row_intents[:self.high_water] != intent_id] = -1.0
+                row = int(scores.argmax())
+                if scores[row] >= self.threshold:
+                    match = self.row_keys[row]
+                    entry = self.entries[match]
+                    if entry.expires > now:
+                        self.entries.move_to_end(match)
+                        self._record("similar")
+                        return entry.value
+                    self._evict(match)
+            self._record("miss")
+
+        value = compute()
+        with self.lock:
+            if self.version != version:
+                # The KB changed while computing; do not cache an answer from the old one
+                return value
+            if key in self.entries:
+                self._evict(key)
+            if not self.free_rows:
+                self._evict(next(iter(self.entries)))
+            row = self.free_rows.pop()
+            self.matrix[row] = vector
+            self.row_intents[row] = intent_id
+            self.row_keys[row] = key
+            self.high_water = max(self.high_water, row + 1)
+            self.entries[key] = Entry(value, now + self.ttl, row)
+        return value
+
+    def stats(self):
+        hits = self.hits["exact"] + self.hits["similar"]
+        total = hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "exact_hits": self.hits["exact"],
+            "similar_hits": self.hits["similar"],
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+        }
@@ -0,0 +1,249 @@
+"""Headless HTTP/JSON turn API for IVR gateways.
+
+    python api.py [--host 0.0.0.0] [--port 8000]
+
+Endpoints (all JSON):
+
+    POST /v1/turn           {"session_id"?, "utterance"?, "caller"?} -> one turn
+    POST /v1/turns          {"turns": [{"session_id"?, "utterance"?, "caller"?}, ...]} -> {"results": [...]}
+    GET  /v1/sessions/<id>  -> current step and handoff record
+    GET  /healthz
+    GET  /metrics           (Prometheus text, when metrics are enabled)
+
+A turn without a session_id starts a new call and returns the first
+prompt. Its `caller` should be the calling line (ANI). Failed policy
+verifications are rate limited per caller; turns without one all share
+a single budget (IVR_POLICY_SHARED_ATTEMPTS). Turns in a batch run in
+order, so several turns for the same session may be sent together. A
+turn that fails gets {"error", "status"} in its slot, and the rest of
+the batch still runs. Sessions live in IVR_SESSION_STORE (in-process
+memory by default); store I/O runs in threads, so a slow Redis round
+trip does not hold up other connections. The engine, KB hot reload,
+event log and metrics are the ones service.py sets up for the Gradio
+app, configured by the same environment variables. The app is plain
+ASGI; uvicorn, which Gradio already installs, serves it with HTTP
+keep-alive.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+
+from dialog import END_STEP
+from session_store import open_store
+
+
+MAX_BODY_BYTES = 4 * 1024 * 1024
+
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+class APIError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class TurnAPI:
+    """ASGI app running dialog turns against a session store.
+
+    Turns go through `process` (service.process_message_async) with
+    `hooks` (a service.TurnHooks), so verification and retrieval run off
+    the event loop under the same timeouts as in the Gradio app. Loading
+    and saving a session also run in threads, bounded by `store_timeout`.
+    Turns for one session are serialized, and each is saved before its
+    reply is sent, so the next turn always reads it back.
+    """
+
+    def __init__(self, engine, store, metrics, process, hooks, store_timeout=2.0):
+        self.engine = engine
+        self.store = store
+        self.metrics = metrics
+        self.process = process
+        self.hooks = hooks
+        self.store_timeout = store_timeout
+        # session_id -> [asyncio.Lock, turns holding or waiting for it]
+        self._locks = {}
+
+    def _state(self, session_state):
+        return {
+            "session_id": session_state["session"].session_id,
+            "step": session_state["step"],
+            "done": session_state["step"] == END_STEP,
+            "handoff": session_state["session"].handoff.to_dict(),
+        }
+
+    @contextlib.asynccontextmanager
+    async def _session_lock(self, session_id):
+        entry = self._locks.get(session_id)
+        if entry is None:
+            entry = self._locks[session_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[session_id]
+
+    async def _store_call(self, coroutine):
+        try:
+            return await asyncio.wait_for(coroutine, self.store_timeout)
+        except asyncio.TimeoutError:
+            self.metrics.inc("hook_timeouts_total", hook="store")
+            raise APIError(503, "session store timed out")
+
+    async def _load(self, session_id):
+        session_state = await self._store_call(asyncio.to_thread(self.store.get, session_id))
+        if session_state is None:
+            raise APIError(404, f"unknown session: {session_id}")
+        return session_state
+
+    async def turn(self, request):
+        """Apply one {"session_id"?, "utterance"?, "caller"?} turn and return the response dict"""
+        if not isinstance(request, dict):
+            raise APIError(400, "each turn must be a JSON object")
+        session_id = request.get("session_id")
+        utterance = request.get("utterance")
+        if session_id is not None and not isinstance(session_id, str):
+            raise APIError(400, "session_id must be a string")
+        if utterance is not None and not isinstance(utterance, str):
+            raise APIError(400, "utterance must be a string")
+        caller = request.get("caller")
+        if caller is not None and not isinstance(caller, str):
+            raise APIError(400, "caller must be a string")
+
+        if session_id is None:
+            # Nobody else knows the new session's ID yet, so there is nothing to lock
+            session_state = self.engine.new_state(caller_line=caller)
+            reply = self.engine.prompt(session_state)
+            session_state["session"].add_message("assistant", reply)
+            return await self._advance(session_state, utterance, reply)
+        if utterance is None:
+            raise APIError(400, "utterance is required for an existing session")
+        async with self._session_lock(session_id):
+            return await self._advance(await self._load(session_id), utterance, None)
+
+    async def _advance(self, session_state, utterance, reply):
+        if utterance is not None:
+            reply, session_state = await self.process(utterance, None, session_state,
+                                                      hooks=self.hooks, persist=False)
+        await self._store_call(self.hooks.persist(session_state))
+        return {"reply": reply, **self._state(session_state)}
+
+    async def batch(self, payload):
+        turns = payload.get("turns") if isinstance(payload, dict) else None
+        if not isinstance(turns, list):
+            raise APIError(400, 'expected {"turns": [...]}')
+        results = []
+        for request in turns:
+            try:
+                results.append(await self.turn(request))
+            except APIError as e:
+                results.append({"error": str(e), "status": e.status})
+            except Exception as e:
+                # Earlier turns are already applied and stored; report this one and keep going
+                self.metrics.inc("api_errors_total", endpoint="turns")
+                print(f"[API] Turn failed: {e!r}")
+                results.append({"error": "internal error", "status": 500})
+        return {"results": results}
+
+    async def session(self, session_id):
+        return self._state(await self._load(session_id))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        method, path = scope["method"], scope["path"]
+        content_type = b"application/json"
+        try:
+            if method == "POST" and path in ("/v1/turn", "/v1/turns"):
+                payload = await _read_json(receive)
+                endpoint = "turn" if path == "/v1/turn" else "turns"
+                with self.metrics.time("api_request_seconds", endpoint=endpoint):
+                    body = await (self.turn(payload) if endpoint == "turn" else self.batch(payload))
+            elif method == "GET" and path.startswith("/v1/sessions/"):
+                body = await self.session(path[len("/v1/sessions/"):])
+            elif method == "GET" and path == "/healthz":
+                body = {"status": "ok", "kb_version": self.engine.kb.version}
+            elif method == "GET" and path == "/metrics" and self.metrics.enabled:
+                await _respond(send, 200, self.metrics.render().encode("utf-8"),
+                               b"text/plain; version=0.0.4; charset=utf-8")
+                return
+            else:
+                raise APIError(404, f"no route for {method} {path}")
+            status = 200
+        except APIError as e:
+            status, body = e.status, {"error": str(e)}
+        await _respond(send, status, _encode(body).encode("utf-8"), content_type)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.store.close()
+                if self.engine.event_log is not None:
+                    self.engine.event_log.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+async def _read_json(receive):
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise APIError(413, "request body too large")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            break
+    try:
+        return json.loads(b"".join(chunks))
+    except ValueError:
+        raise APIError(400, "request body is not valid JSON")
+
+
+async def _respond(send, status, body, content_type):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def create_app():
+    """TurnAPI over the same engine, KB watcher, event log and store as the Gradio app (service.py)"""
+    # Unlike gr.State, the API has nowhere else to keep sessions
+    os.environ.setdefault("IVR_SESSION_STORE", "memory")
+    import service
+
+    store = service.session_store or open_store("memory").start()
+    return TurnAPI(service.engine, store, service.metrics, service.process_message_async,
+                   service.TurnHooks(store))
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the headless IVR turn API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    uvicorn.run(create_app(), host=args.host, port=args.port,
+                timeout_keep_alive=75, access_log=False)
+
+
+if __name__ == "__main__":
+    main()
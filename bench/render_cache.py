@@ -0,0 +1,55 @@
+"""Measure per-turn allocations on the intent-selection turn, where the
+retrieved article snippet is rendered into the reply.
+
+Run from the repository root:
+
+    python -m bench.render_cache [n_turns]
+
+"cold" clears the KB snippet cache and the engine's fragment cache
+before every turn, which is what each turn paid before they existed;
+"warm" is the normal path. Figures are the traced peak above the
+starting point, averaged over turns.
+"""
+import sys
+import time
+import tracemalloc
+
+from dialog import DialogEngine
+from knowledge_base import KnowledgeBase
+from retrieval import HashingEmbedder
+from session import CallSession
+
+
+def run_turns(engine, n_turns, cold):
+    peak_total = 0
+    elapsed = 0.0
+    for i in range(n_turns):
+        session_state = engine.new_state()
+        session_state["step"] = "intent_selection"
+        message = "1" if i % 2 == 0 else "3"
+        if cold:
+            engine.kb.snippets.clear()
+            engine._fragments.clear()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        engine.advance(session_state, message)
+        elapsed += time.perf_counter() - start
+        peak_total += tracemalloc.get_traced_memory()[1] - base
+    return peak_total / n_turns, elapsed / n_turns
+
+
+def main():
+    n_turns = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    kb = KnowledgeBase(embedder=HashingEmbedder(), use_cache=False)
+    engine = DialogEngine(kb, CallSession)
+
+    tracemalloc.start()
+    for label, cold in (("cold", True), ("warm", False)):
+        peak, latency = run_turns(engine, n_turns, cold)
+        print(f"{label}: {peak:,.0f} bytes peak/turn, {latency * 1e6:,.1f} µs/turn (traced)")
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Measure memory per CallSession after a full scripted claim call.
+
+Run from the repository root:
+
+    python -m bench.session_memory [n_sessions]
+
+The "dict form" figure is what materializing the same sessions through
+`session.state` adds on top: the free-form dict with one history dict and
+one ISO timestamp string per message that CallSession used to hold. The
+message strings themselves are shared, so they are not counted twice.
+"""
+import sys
+import tracemalloc
+
+from dialog import DialogEngine
+from knowledge_base import KnowledgeBase
+from retrieval import HashingEmbedder
+from session import CallSession
+
+
+CLAIM_CALL = ["POL123456", "1", "Rear-ended at a stoplight", "This morning",
+              "Highway 101, San Jose", "Rear bumper crumpled", "yes", "2"]
+
+
+def run_calls(engine, n_sessions):
+    sessions = []
+    for _ in range(n_sessions):
+        session_state = engine.new_state()
+        for message in CLAIM_CALL:
+            # Caller input arrives as fresh strings, not shared literals
+            engine.advance(session_state, message.encode().decode())
+        sessions.append(session_state["session"])
+    return sessions
+
+
+def main():
+    n_sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    kb = KnowledgeBase(embedder=HashingEmbedder(), use_cache=False)
+    engine = DialogEngine(kb, CallSession)
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    sessions = run_calls(engine, n_sessions)
+    slotted = tracemalloc.get_traced_memory()[0] - base
+
+    base = tracemalloc.get_traced_memory()[0]
+    dict_form = [session.state for session in sessions]
+    materialized = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    turns = sessions[0].turn_count
+    print(f"sessions:                {n_sessions}")
+    print(f"history entries/session: {turns}")
+    print(f"slotted session:         {slotted / n_sessions:,.0f} bytes/session")
+    print(f"dict form overhead:      {materialized / n_sessions:,.0f} bytes/session")
+    del dict_form
+
+
+if __name__ == "__main__":
+    main()
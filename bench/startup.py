@@ -0,0 +1,74 @@
+"""Measure cold-start time and peak memory of each entry point.
+
+Run from the repository root:
+
+    python -m bench.startup [runs]
+
+Every target runs in a fresh interpreter, `runs` times (default 5), and
+reports the median wall time to get ready for the first turn, the peak
+RSS, and which heavy optional packages ended up imported. A warm
+embedding cache is built first so the figures are for a normal restart.
+"""
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = ("gradio", "sentence_transformers", "torch", "numpy")
+
+TARGETS = [
+    ("cli", "import main\n"
+            "main.DialogEngine(main.KnowledgeBase(), main.CallSession, classifier=main.IntentClassifier())"),
+    ("service (batch, eval)", "import service"),
+    ("api", "import api\napi.create_app()"),
+    ("handoff / event log", "import handoff, event_log, session_store"),
+    ("gradio app", "import app"),
+]
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+exec(compile(sys.argv[1], "<target>", "exec"))
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "seconds": elapsed,
+    "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "heavy": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY,)
+
+
+def run_target(code):
+    env = {**os.environ, "IVR_KB_RELOAD_INTERVAL": "0"}
+    env.pop("IVR_EVENT_LOG", None)
+    env.pop("IVR_METRICS_PORT", None)
+    result = subprocess.run([sys.executable, "-c", PROBE, code], cwd=ROOT, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    run_target(TARGETS[0][1])  # warm the embedding cache
+
+    print(f"{'target':24} {'start (ms)':>10} {'peak RSS':>10}  heavy imports")
+    for label, code in TARGETS:
+        if label == "gradio app" and importlib.util.find_spec("gradio") is None:
+            print(f"{label:24} {'skipped (gradio not installed)':>22}")
+            continue
+        samples = [run_target(code) for _ in range(runs)]
+        seconds = statistics.median(s["seconds"] for s in samples)
+        rss_mb = max(s["maxrss_kb"] for s in samples) / 1024
+        heavy = ", ".join(samples[-1]["heavy"]) or "-"
+        print(f"{label:24} {seconds * 1000:10.1f} {rss_mb:8.1f}MB  {heavy}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from retrieval import tokenize
+
+
+class BM25Index:
+    """Inverted index with BM25 scoring.
+
+    Each token maps to a postings pair of parallel arrays (doc ids,
+    term frequencies). A query only touches the postings of its own
+    terms, and the BM25 weights for a term are computed in one
+    vectorized step over its postings.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.keys = []
+        self.postings = {}
+        self.idf = {}
+        self.length_norm = np.zeros(0, dtype=np.float32)
+
+    def build(self, docs):
+        """Index a {key: text} mapping"""
+        self.keys = list(docs)
+        doc_ids = {}
+        freqs = {}
+        lengths = array('I')
+
+        for doc_id, key in enumerate(self.keys):
+            tokens = tokenize(docs[key])
+            lengths.append(len(tokens))
+            for token, tf in Counter(tokens).items():
+                if token not in doc_ids:
+                    doc_ids[token] = array('I')
+                    freqs[token] = array('H')
+                doc_ids[token].append(doc_id)
+                freqs[token].append(min(tf, 0xFFFF))
+
+        n_docs = len(self.keys)
+        self.postings = {
+            token: (np.frombuffer(ids, dtype=np.uint32), np.frombuffer(freqs[token], dtype=np.uint16))
+            for token, ids in doc_ids.items()
+        }
+        self.idf = {
+            token: float(np.log(1.0 + (n_docs - len(ids) + 0.5) / (len(ids) + 0.5)))
+            for token, ids in doc_ids.items()
+        }
+
+        lengths = np.frombuffer(lengths, dtype=np.uint32).astype(np.float32)
+        avg_length = float(lengths.mean()) if n_docs and lengths.any() else 1.0
+        self.length_norm = self.k1 * (1.0 - self.b + self.b * lengths / avg_length)
+
+    def search(self, query, k=3, rows=None):
+        """Return the k best (key, score) pairs; documents sharing no term with the query are never scored.
+
+        `rows` = (start, end) restricts the search to the keys at those
+        positions in build order. Postings are sorted by doc id, so each
+        term's slice is found by binary search and nothing outside it is scored.
+        """
+        terms = Counter(t for t in tokenize(query) if t in self.postings)
+        if not terms:
+            return []
+
+        term_weights = []
+        for term, query_tf in terms.items():
+            ids, tfs = self.postings[term]
+            if rows is not None:
+                lo, hi = np.searchsorted(ids, rows)
+                if lo == hi:
+                    continue
+                ids, tfs = ids[lo:hi], tfs[lo:hi]
+            tfs = tfs.astype(np.float32)
+            weights = (self.idf[term] * query_tf) * tfs * (self.k1 + 1.0) / (tfs + self.length_norm[ids])
+            term_weights.append((ids, weights))
+
+        if not term_weights:
+            return []
+        if len(term_weights) == 1:
+            doc_ids, doc_scores = term_weights[0]
+        else:
+            doc_ids, inverse = np.unique(np.concatenate([ids for ids, _ in term_weights]), return_inverse=True)
+            doc_scores = np.zeros(len(doc_ids), dtype=np.float32)
+            offset = 0
+            for ids, weights in term_weights:
+                doc_scores[inverse[offset:offset + len(ids)]] += weights
+                offset += len(ids)
+
+        k = min(k, len(doc_ids))
+        if k < len(doc_ids):
+            top = np.argpartition(-doc_scores, k - 1)[:k]
+        else:
+            top = np.arange(len(doc_ids))
+        top = top[np.argsort(-doc_scores[top], kind="stable")]
+        return [(self.keys[doc_ids[i]], float(doc_scores[i])) for i in top]
+
+
+def reciprocal_rank_fusion(*rankings, k=60, limit=None):
+    """Fuse ranked (key, score) lists by summing 1 / (k + rank) per key"""
+    fused = {}
+    for ranking in rankings:
+        for rank, (key, _score) in enumerate(ranking, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+    ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+    return ranked[:limit] if limit else ranked
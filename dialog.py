@@ -0,0 +1,590 @@
+import re
+import sys
+
+from metrics import NullMetrics
+from sentiment import SentimentScorer
+from slots import EXTRACTORS, WHEN, extract_policy_number, extract_slots
+
+
+MENU_PROMPT = (
+    "Please select an option:\n"
+    "1. File a claim\n"
+    "2. Billing and payments\n"
+    "3. Roadside assistance\n"
+    "4. Policy changes\n"
+    "Or just tell me what you need."
+)
+
+FINAL_PROMPT = (
+    "Based on the information you've provided:\n"
+    "1. Continue and complete this on your own\n"
+    "2. Transfer to a specialist agent\n"
+    "\n"
+    "Your choice (1 or 2):"
+)
+
+INTENT_MAP = {"1": "file_claim", "2": "billing", "3": "roadside", "4": "policy_change"}
+BILLING_MAP = {"1": "make_payment", "2": "payment_arrangement", "3": "billing_question"}
+
+# Sentinel: the engine computes the value itself instead of using a pre-fetched one
+UNSET = object()
+
+
+# --- Effects and actions referenced from the flow table ---
+
+def add_step(description):
+    def effect(session):
+        session.add_step(description)
+    return effect
+
+
+def set_sentiment(sentiment):
+    def effect(session):
+        session.update("sentiment", sentiment)
+    return effect
+
+
+VERIFY_REPLIES = {
+    "invalid": "✗ Invalid policy number. Continuing without verification.\n\n",
+    "rate_limited": "✗ Too many verification attempts from this line. Continuing without verification.\n\n",
+    "unavailable": "✗ We couldn't check your policy number right now. Continuing without verification.\n\n",
+}
+
+
+def verify_action(engine, session, value, prefetched):
+    result = prefetched.get("verified", UNSET)
+    if result is UNSET:
+        result = engine.verify(value, session.caller_line)
+    if result is True or result == "verified":
+        session.update("caller_id", value)
+        session.update("verified", True)
+        return "✓ Verified. Thank you!\n\n"
+    # Hooks written before the result strings may still return False
+    return VERIFY_REPLIES.get(result, VERIFY_REPLIES["invalid"])
+
+
+def retrieve_action(engine, session, intent, prefetched):
+    doc_info = prefetched.get("doc_info", UNSET)
+    if doc_info is UNSET:
+        with engine.metrics.time("kb_retrieve_seconds"):
+            # The caller's own words pick the article section to show
+            doc_info = engine.kb.retrieve(intent, session.issue_description or session.last_user_message)
+    if not doc_info:
+        return ""
+    session.add_retrieved_doc(doc_info["doc_name"])
+    return engine.retrieval_fragment(doc_info["doc_name"], doc_info.get("section"))
+
+
+def handoff_action(engine, session, choice, prefetched):
+    if choice == "transfer":
+        if session.sentiment != "urgent":
+            session.update("sentiment", "needs_agent")
+        header = "🔄 Transferring to agent...\n\n"
+    else:
+        session.add_step("Attempted self-service completion")
+        header = "✓ Proceeding with self-service...\n\n"
+    metrics = engine.metrics
+    with metrics.time("handoff_render_seconds"):
+        summary = session.handoff.render()
+    if metrics.enabled:
+        metrics.observe("session_turns", session.turn_count)
+        metrics.observe("handoff_summary_chars", len(summary))
+    return header + summary
+
+
+def complete_action(engine, session, value, prefetched):
+    return "This session is complete. Refresh the page to start a new conversation."
+
+
+# --- Declarative call flow ---
+#
+# prompt:      shown when the step is entered (None for terminal replies)
+# slot:        where the answer goes: a top-level state key or "incident_details.<field>"
+# normalize:   "strip" (default), "lower", "yesno" (leading yes/no word, else lowercased),
+#              "policy" (first policy-number token, else stripped) or "raw"
+# choices:     menu digit -> value; anything else gets the `invalid` reply
+# classify:    free text outside `choices` goes to the engine's intent classifier
+# default:     value used for input outside `choices` instead of rejecting it
+# effects:     value -> list of side effects on the session
+# action:      callable returning the acknowledgement text placed before the next prompt
+# hook:        name of the I/O the action performs, for async front ends to pre-fetch
+# early:       regex that, once found in a partial transcript, means the answer is usable
+# extract:     slots.EXTRACTORS name; a match in any earlier free-text answer fills this
+#              step in advance and the question is skipped
+# next:        next step name, or {value: step} with "*" as the fallback
+
+FLOW = [
+    {"name": "verification", "prompt": "Please enter your policy number:", "normalize": "policy",
+     "action": verify_action, "hook": "verify", "next": "intent_selection"},
+    {"name": "intent_selection", "prompt": MENU_PROMPT, "slot": "intent",
+     "choices": INTENT_MAP, "classify": True,
+     "invalid": "Sorry, I didn't catch that. Please enter 1, 2, 3, or 4, or describe what you need.",
+     "action": retrieve_action, "hook": "retrieve",
+     "next": {"file_claim": "claim_description", "billing": "billing_type",
+              "roadside": "roadside_description", "*": "general_description"}},
+
+    {"name": "claim_description", "prompt": "I'll help you file a claim. Briefly, what happened?",
+     "slot": "issue_description", "normalize": "raw", "next": "claim_when"},
+    {"name": "claim_when", "prompt": "When did this happen? (e.g., 'yesterday', 'this morning')",
+     "slot": "incident_details.when", "normalize": "raw", "early": WHEN,
+     "extract": "when", "next": "claim_where"},
+    {"name": "claim_where", "prompt": "Where did this occur? (city/location)",
+     "slot": "incident_details.where", "normalize": "raw", "extract": "where", "next": "claim_damage"},
+    {"name": "claim_damage", "prompt": "What damage occurred? (brief description)",
+     "slot": "incident_details.damage", "normalize": "raw", "extract": "damage", "next": "claim_photos"},
+    {"name": "claim_photos", "prompt": "Do you have photos of the damage? (yes/no)",
+     "slot": "incident_details.photos_available", "normalize": "yesno", "extract": "photos",
+     "effects": {"yes": [add_step("Took photos of damage")]}, "next": "final_choice"},
+
+    {"name": "billing_type",
+     "prompt": "What billing issue can I help with?\n1. Make a payment\n"
+               "2. Payment arrangement/extension\n3. Question about my bill",
+     "slot": "incident_details.billing_type", "choices": BILLING_MAP,
+     "invalid": "Please enter 1, 2, or 3.",
+     "next": {"payment_arrangement": "billing_reason", "*": "final_choice"}},
+    {"name": "billing_reason", "prompt": "Can you briefly explain why you need an arrangement?",
+     "slot": "incident_details.arrangement_reason", "normalize": "raw", "next": "final_choice"},
+
+    {"name": "roadside_description", "prompt": "I'll get you roadside help. What's your situation?",
+     "slot": "issue_description", "normalize": "raw", "next": "roadside_location"},
+    {"name": "roadside_location", "prompt": "What's your current location?",
+     "slot": "incident_details.location", "normalize": "raw", "extract": "where", "next": "roadside_issue"},
+    {"name": "roadside_issue", "prompt": "What's wrong with your vehicle? (e.g., flat tire, won't start)",
+     "slot": "incident_details.vehicle_issue", "normalize": "raw", "extract": "vehicle_issue",
+     "next": "roadside_safety"},
+    {"name": "roadside_safety", "prompt": "Are you in a safe location? (yes/no)",
+     "slot": "incident_details.safe", "normalize": "yesno", "extract": "safe",
+     "effects": {"no": [set_sentiment("urgent")]}, "next": "final_choice"},
+
+    {"name": "general_description", "prompt": "What would you like to change about your policy?",
+     "slot": "issue_description", "normalize": "raw", "next": "final_choice"},
+
+    {"name": "final_choice", "prompt": FINAL_PROMPT, "choices": {"2": "transfer"},
+     "default": "self_service", "action": handoff_action, "next": "complete"},
+    {"name": "complete", "prompt": None, "action": complete_action, "next": "complete"},
+]
+
+START_STEP = "verification"
+END_STEP = "complete"
+
+# Pressing 0 mid-call goes straight to an agent with whatever has been collected so far
+ZERO_OUT = "0"
+
+
+class CompiledStep:
+    """One flow step with its parser, slot writer and transitions resolved up front"""
+
+    __slots__ = ("name", "prompt", "parse", "early", "provisional", "extract", "label", "slot", "assign",
+                 "choices", "classify", "effects", "action", "hook", "invalid", "transitions", "fallback")
+
+    def __init__(self, spec, classifier=None):
+        self.name = spec["name"]
+        # Interned so every reply that ends on this prompt shares one string
+        self.prompt = sys.intern(spec["prompt"]) if spec.get("prompt") else None
+        self.parse = _compile_parser(spec, classifier)
+        self.early = _compile_early(spec)
+        self.extract = spec.get("extract")
+        self.slot = spec.get("slot")
+        self.label = (self.slot or "").rsplit(".", 1)[-1].replace("_", " ")
+        self.assign = _compile_slot(self.slot)
+        self.choices = spec.get("choices")
+        self.classify = bool(spec.get("classify")) and classifier is not None
+        # Free-text slots are filled from partial transcripts while the caller is still talking
+        self.provisional = self.assign is not None and spec.get("normalize") == "raw"
+        self.effects = spec.get("effects", {})
+        self.action = spec.get("action")
+        self.hook = spec.get("hook")
+        self.invalid = spec.get("invalid", "I'm not sure how to help with that. Please try again.")
+
+        next_step = spec["next"]
+        if isinstance(next_step, dict):
+            self.transitions = {k: v for k, v in next_step.items() if k != "*"}
+            self.fallback = next_step.get("*")
+        else:
+            self.transitions = {}
+            self.fallback = next_step
+
+
+_YES_NO = re.compile(r"\s*(yes|yeah|yep|no|nope)\b", re.IGNORECASE)
+_YES_NO_VALUES = {"yes": "yes", "yeah": "yes", "yep": "yes", "no": "no", "nope": "no"}
+
+
+def _parse_yes_no(message):
+    match = _YES_NO.match(message)
+    if match:
+        return _YES_NO_VALUES[match.group(1).lower()]
+    return message.strip().lower()
+
+
+def _compile_parser(spec, classifier=None):
+    normalize = spec.get("normalize", "strip")
+    choices = spec.get("choices")
+    default = spec.get("default")
+
+    if choices is not None and spec.get("classify") and classifier is not None:
+        def parse(message):
+            value = choices.get(message.strip())
+            return value if value is not None else classifier.classify(message)
+        return parse
+    if choices is not None:
+        if default is None:
+            return lambda message: choices.get(message.strip())
+        return lambda message: choices.get(message.strip(), default)
+    if normalize == "lower":
+        return lambda message: message.strip().lower()
+    if normalize == "yesno":
+        return _parse_yes_no
+    if normalize == "policy":
+        return lambda message: extract_policy_number(message) or message.strip()
+    if normalize == "raw":
+        return lambda message: message
+    return lambda message: message.strip()
+
+
+def _compile_early(spec):
+    """Parser for partial transcripts: returns the value once it is settled, else None"""
+    choices = spec.get("choices")
+    if choices is not None:
+        return lambda text: choices.get(text.strip())
+    if spec.get("normalize") == "yesno":
+        def early(text):
+            match = _YES_NO.match(text)
+            return _YES_NO_VALUES[match.group(1).lower()] if match else None
+        return early
+    pattern = spec.get("early")
+    if pattern is not None:
+        return lambda text: text if pattern.search(text) else None
+    return None
+
+
+def _compile_slot(slot):
+    if slot is None:
+        return None
+    if slot.startswith("incident_details."):
+        field = slot.split(".", 1)[1]
+
+        def assign(session, value):
+            session.set_detail(field, value)
+        return assign
+
+    def assign(session, value):
+        session.update(slot, value)
+    return assign
+
+
+def compile_flow(flow, classifier=None):
+    """Build the step-name -> CompiledStep dispatch table, checking every transition target"""
+    table = {spec["name"]: CompiledStep(spec, classifier) for spec in flow}
+    for step in table.values():
+        for target in list(step.transitions.values()) + [step.fallback]:
+            if target not in table:
+                raise ValueError(f"Step '{step.name}' transitions to unknown step '{target}'")
+    return table
+
+
+class DialogEngine:
+    """Drives a CallSession through the compiled flow one utterance at a time.
+
+    Front ends own the I/O: the CLI feeds it input() lines and the Gradio
+    app feeds it chat messages. The per-turn state is the same
+    session_state dict the Gradio app keeps in gr.State.
+
+    With a `classifier` (see intent_classifier.py), steps marked "classify"
+    also accept free text such as "my car won't start". `metrics` (see
+    metrics.py) receives per-step latency, retrieval and render timings;
+    the default discards them. Every caller utterance goes through the
+    `scorer` (sentiment.SentimentScorer by default; pass False to disable),
+    which can raise the session's sentiment mid-call. With an `event_log`
+    (event_log.EventLog), every session the engine touches is attached to
+    it, including sessions loaded back from a store. A `verifier`
+    (policy_index.PolicyVerifier) checks policy numbers against the local
+    policy book; without one any number of 6+ characters is accepted.
+    """
+
+    def __init__(self, kb, session_factory, flow=FLOW, snippet_lines=10, rule_width=40,
+                 classifier=None, metrics=None, scorer=None, event_log=None, verifier=None):
+        self.kb = kb
+        self.session_factory = session_factory
+        self.classifier = classifier
+        self.metrics = metrics or NullMetrics()
+        self.scorer = SentimentScorer() if scorer is None else scorer
+        self.event_log = event_log
+        self.verifier = verifier
+        self.steps = compile_flow(flow, classifier)
+        self._extract_steps = [(step.name, step.extract) for step in self.steps.values() if step.extract]
+        self._extractors = sorted({extractor for _, extractor in self._extract_steps})
+        self.snippet_lines = snippet_lines
+        self.rule_width = rule_width
+        self._fragments = {}
+        self._fragments_version = None
+        for doc_name in getattr(kb, "docs", ()):
+            self.retrieval_fragment(doc_name)
+
+    def retrieval_fragment(self, doc_name, section=None):
+        """The "📄 Retrieved" reply block for a document or one of its sections, rendered once per KB version"""
+        version = getattr(self.kb, "version", 0)
+        if version != self._fragments_version:
+            self._fragments = {}
+            self._fragments_version = version
+        key = doc_name if section is None else (doc_name, section.start)
+        fragment = self._fragments.get(key)
+        if fragment is None:
+            title = doc_name
+            snippet = None
+            if section is not None:
+                snippet = self.kb.get_section(section, max_lines=self.snippet_lines)
+                if section.heading:
+                    title = f"{doc_name} › {section.heading}"
+            if snippet is None:
+                title = doc_name
+                snippet = self.kb.get_snippet(doc_name, max_lines=self.snippet_lines)
+            rule = "─" * self.rule_width
+            fragment = f"\n\n📄 Retrieved: {title}\n{rule}\n{snippet}\n{rule}\n\n"
+            self._fragments[key] = fragment
+        return fragment
+
+    def verify(self, policy_number, caller=None):
+        """"verified", "invalid" or "rate_limited"; `caller` (the session's caller_line) keys the rate limit"""
+        if self.verifier is not None:
+            result = self.verifier.verify(policy_number, caller)
+            if result == "rate_limited":
+                return result
+            return "verified" if result == "present" else "invalid"
+        # Simulated verification: any policy number of 6+ characters is valid
+        return "verified" if len(policy_number) >= 6 else "invalid"
+
+    def new_state(self, session=None, caller_line=None):
+        session = session or self.session_factory()
+        if self.event_log is not None:
+            session.attach_log(self.event_log)
+        if caller_line is not None:
+            session.update("caller_line", caller_line)
+        return {
+            "session": session,
+            "step": START_STEP,
+            "intent_details": {},
+            "prefill": {}
+        }
+
+    def prompt(self, session_state):
+        return self.steps[session_state["step"]].prompt
+
+    def advance(self, session_state, message, **prefetched):
+        """Apply one caller utterance and return the reply.
+
+        `prefetched` may carry `verified` or `doc_info` already resolved by
+        an async front end, so the action does not repeat the I/O, and
+        `parsed`, the step's answer when the front end already parsed it
+        (e.g. an intent from a micro-batched classify_async).
+        """
+        step = self.steps[session_state["step"]]
+        with self.metrics.time("step_seconds", step=step.name):
+            return self._advance(session_state, step, message, prefetched)
+
+    def _advance(self, session_state, step, message, prefetched):
+        session = session_state["session"]
+        if self.event_log is not None and session.events is None:
+            # Sessions decoded from a store come back without a log attached
+            session.events = self.event_log
+        session.add_message("user", message)
+        if self.scorer:
+            self.scorer.apply(session, message)
+
+        if message.strip() == ZERO_OUT and step.name not in (START_STEP, END_STEP):
+            session_state["step"] = END_STEP
+            reply = handoff_action(self, session, "transfer", prefetched)
+            session.add_message("assistant", reply)
+            return reply
+
+        value = prefetched.get("parsed", UNSET)
+        if value is UNSET:
+            value = step.parse(message)
+        if value is None:
+            reply = step.invalid
+        else:
+            ack = self._apply(step, session, value, prefetched)
+            next_name = step.transitions.get(value, step.fallback)
+            if step.provisional and self._extract_steps:
+                self._prefill(session_state, message)
+            elif step.classify and message.strip() not in step.choices:
+                self._prefill_description(session_state, next_name, message)
+            next_name, noted = self._skip_answered(session_state, next_name)
+            session_state["step"] = next_name
+            reply = ack + noted + (self.steps[next_name].prompt or "")
+
+        session.add_message("assistant", reply)
+        return reply
+
+    def _apply(self, step, session, value, prefetched):
+        if step.assign:
+            step.assign(session, value)
+        for effect in step.effects.get(value, ()):
+            effect(session)
+        return step.action(self, session, value, prefetched) if step.action else ""
+
+    def _prefill(self, session_state, message):
+        """Remember answers to later questions found in a free-text answer"""
+        found = extract_slots(message, self._extractors)
+        if found:
+            prefill = session_state.setdefault("prefill", {})
+            for step_name, extractor in self._extract_steps:
+                if extractor in found:
+                    prefill[step_name] = found[extractor]
+
+    def _prefill_description(self, session_state, next_name, message):
+        """A need described in words instead of a menu digit is also the issue description"""
+        session = session_state["session"]
+        if not session.issue_description:
+            session.update("issue_description", message.strip())
+        prefill = session_state.setdefault("prefill", {})
+        if self.steps[next_name].slot == "issue_description":
+            # "What happened?" is already answered
+            prefill[next_name] = message
+        if self._extract_steps:
+            self._prefill(session_state, message)
+
+    def _skip_answered(self, session_state, next_name):
+        """Apply prefilled answers for the steps ahead; returns (first open step, acknowledgement)"""
+        prefill = session_state.get("prefill")
+        noted = []
+        while prefill and next_name in prefill:
+            step = self.steps[next_name]
+            value = step.parse(prefill.pop(next_name))
+            self._apply(step, session_state["session"], value, {})
+            self.metrics.inc("questions_skipped_total", step=step.name)
+            noted.append(f"{step.label}: {value}")
+            next_name = step.transitions.get(value, step.fallback)
+        if next_name == END_STEP and prefill:
+            prefill.clear()
+        return next_name, "Got it (" + "; ".join(noted) + ").\n\n" if noted else ""
+
+    def advance_stream(self, session_state, partials):
+        """Apply one utterance arriving as partial ASR transcripts.
+
+        `partials` yields cumulative hypotheses of the utterance, the last
+        being the final transcript. Yields events as they become known:
+
+            {"type": "partial", "step": ..., "text": ...}  free-text slot filled provisionally
+            {"type": "reply", "text": ..., "early": bool}  the reply (see below for a second one)
+
+        The reply comes early, before the caller stops talking, as soon as a
+        partial settles the step (a menu digit, yes/no, a relative time).
+        Words that arrive after that revise a free-text slot. If they also
+        answer the question the early reply asked ("yesterday ... on
+        Highway 101"), a second, non-early reply skips past it. If the final
+        transcript settles a yes/no or menu step differently from the partial
+        that triggered the early reply ("No" -> "Now I'm safe"), the answer
+        is revised and a second reply corrects it.
+        """
+        turn = _StreamTurn(self, session_state)
+        for text in partials:
+            yield from turn.feed(text)
+        yield from turn.finish()
+
+    async def advance_stream_async(self, session_state, partials):
+        """advance_stream for an async iterator of partial transcripts"""
+        turn = _StreamTurn(self, session_state)
+        async for text in partials:
+            for event in turn.feed(text):
+                yield event
+        for event in turn.finish():
+            yield event
+
+
+class _StreamTurn:
+    """Per-utterance state for DialogEngine.advance_stream"""
+
+    __slots__ = ("engine", "session_state", "step", "text", "committed", "said", "value", "before")
+
+    def __init__(self, engine, session_state):
+        self.engine = engine
+        self.session_state = session_state
+        self.step = engine.steps[session_state["step"]]
+        self.text = ""
+        self.committed = False
+
+    def feed(self, text):
+        self.text = text
+        step = self.step
+        if self.committed:
+            return
+        value = step.early(text) if step.early is not None else None
+        if value is not None:
+            session = self.session_state["session"]
+            self.committed = True
+            self.said = text
+            self.value = value
+            # What the step's effects may change, so a misheard answer can be taken back
+            self.before = (session.sentiment, len(session.steps_tried))
+            yield {"type": "reply", "text": self.engine.advance(self.session_state, text), "early": True}
+        elif step.provisional and text.strip():
+            step.assign(self.session_state["session"], text)
+            yield {"type": "partial", "step": step.name, "text": text}
+
+    def finish(self):
+        if not self.committed:
+            yield {"type": "reply", "text": self.engine.advance(self.session_state, self.text), "early": False}
+            return
+        if self.text != self.said:
+            # History and the event log keep what the caller actually finished saying
+            self.session_state["session"].add_message("user", self.text)
+        if self.step.provisional:
+            # The caller kept talking after the early reply: keep the whole answer
+            self.step.assign(self.session_state["session"], self.text)
+            yield {"type": "partial", "step": self.step.name, "text": self.text}
+            yield from self._answer_ahead()
+        elif self.text != self.said:
+            value = self._reparse()
+            if value is not None and value != self.value:
+                yield from self._revise(value)
+
+    def _reparse(self):
+        """The step's answer in the final transcript, or None if it does not settle one"""
+        step, text = self.step, self.text
+        value = step.early(text)
+        if value is None and step.extract:
+            value = EXTRACTORS[step.extract](text)
+        if value is None and step.choices is None:
+            value = step.parse(text)
+        return value
+
+    def _revise(self, value):
+        """The final transcript changed a settled answer ("No" -> "Now I'm safe"): apply the new one"""
+        engine, session_state = self.engine, self.session_state
+        session, step = session_state["session"], self.step
+        sentiment, steps = self.before
+        if len(session.steps_tried) > steps:
+            session.update("steps_tried", session.steps_tried[:steps])
+        if session.sentiment != sentiment:
+            session.update("sentiment", sentiment)
+        if engine.scorer:
+            engine.scorer.apply(session, self.text)
+        engine.metrics.inc("answers_revised_total", step=step.name)
+
+        ack = engine._apply(step, session, value, {})
+        next_name = step.transitions.get(value, step.fallback)
+        if next_name == step.transitions.get(self.value, step.fallback):
+            # Same question next: it has already been asked
+            next_name = session_state["step"]
+        else:
+            next_name, noted = engine._skip_answered(session_state, next_name)
+            ack += noted
+            session_state["step"] = next_name
+        reply = (f"Sorry, I misheard. Got it ({step.label}: {value}).\n\n" + ack
+                 + (engine.steps[next_name].prompt or ""))
+        session.add_message("assistant", reply)
+        yield {"type": "reply", "text": reply, "early": False}
+
+    def _answer_ahead(self):
+        """Fill later questions from the words that came after the early reply, as advance does"""
+        engine, session_state = self.engine, self.session_state
+        if not engine._extract_steps:
+            return
+        engine._prefill(session_state, self.text)
+        asked = session_state["step"]
+        next_name, noted = engine._skip_answered(session_state, asked)
+        if next_name != asked:
+            session_state["step"] = next_name
+            reply = noted + (engine.steps[next_name].prompt or "")
+            session_state["session"].add_message("assistant", reply)
+            yield {"type": "reply", "text": reply, "early": False}
@@ -0,0 +1,396 @@
+"""Replay and load-test harness driven by eval/test-scenarios.md.
+
+Run from the repository root:
+
+    python -m eval.harness replay              # every scenario through the engine and the CLI
+    python -m eval.harness load --callers 200 --calls 5000 --seed 7
+
+`replay` turns each scenario's user journey into a scripted call, plays
+it through `process_message` (service.py, the Gradio app's entry point,
+which runs without gradio installed) and through the CLI's main() with
+scripted input, then checks the expected outcomes it knows how to check
+against the session each of them ends with. `load` fans randomized variations of the scenarios
+out to N concurrent synthetic callers and reports throughput, turn
+latency percentiles and memory per session.
+"""
+import argparse
+import asyncio
+import builtins
+import contextlib
+import io
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+from dialog import END_STEP, DialogEngine
+from knowledge_base import KnowledgeBase
+from session import CallSession
+
+
+SCENARIO_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test-scenarios.md")
+
+VALID_POLICY = "POL123456"
+INVALID_POLICY = "12"
+FILLER = "Not sure"
+
+MENU_OPTIONS = {
+    "file a claim": "1",
+    "billing and payments": "2",
+    "roadside assistance": "3",
+    "policy changes": "4",
+}
+BILLING_OPTIONS = {
+    "make a payment": "1",
+    "payment arrangement/extension": "2",
+    "question about my bill": "3",
+}
+
+# Journey labels ("When: This morning") -> the flow steps that consume them
+LABEL_STEPS = {
+    "describes": ("claim_description", "roadside_description", "general_description"),
+    "when": ("claim_when",),
+    "where": ("claim_where",),
+    "damage": ("claim_damage",),
+    "photos": ("claim_photos",),
+    "location": ("roadside_location",),
+    "issue": ("roadside_issue", "roadside_description"),
+    "safe location": ("roadside_safety",),
+    "reason": ("billing_reason",),
+}
+
+_SECTION = re.compile(r"^## (Scenario \d+: .+)$", re.MULTILINE)
+_JOURNEY_ITEM = re.compile(r"^\s*(?:\d+\.|-)\s+(.*)$")
+_LABELLED = re.compile(r'^([A-Za-z ]+):\s*"?(.*?)"?$')
+_QUOTED = re.compile(r'"([^"]+)"')
+_TURN_RANGE = re.compile(r"Conversation turns:\s*(\d+)-(\d+)")
+_BACKTICK = re.compile(r"`([^`]+)`")
+
+
+class Scenario:
+    """One scenario from the markdown: its scripted answers and the outcomes to check"""
+
+    def __init__(self, title):
+        self.title = title
+        self.policy_number = VALID_POLICY
+        self.menu_choice = None
+        self.billing_choice = None
+        self.final_choice = "2"
+        self.answers = {}
+        self.expected = []
+
+    def answer_for(self, step):
+        if step == "verification":
+            return self.policy_number
+        if step == "intent_selection":
+            return self.menu_choice
+        if step == "billing_type":
+            return self.billing_choice
+        if step == "final_choice":
+            return self.final_choice
+        return self.answers.get(step, FILLER)
+
+
+def _section(text, heading):
+    match = re.search(rf"\*\*{heading}:\*\*\s*\n(.*?)(?=\n\*\*|\Z)", text, re.DOTALL)
+    return match.group(1) if match else ""
+
+
+def _set_answer(scenario, label, value):
+    for step in LABEL_STEPS.get(label, ()):
+        if step not in scenario.answers:
+            scenario.answers[step] = value
+            return
+
+
+def _parse_journey_item(scenario, item):
+    lowered = item.lower()
+    quoted = _QUOTED.findall(item)
+
+    if "policy number" in lowered or lowered.startswith("verified"):
+        if "invalid" in lowered or "short" in lowered:
+            scenario.policy_number = INVALID_POLICY
+        return
+    if lowered.startswith("selects"):
+        option = quoted[0].lower() if quoted else ""
+        if option in MENU_OPTIONS and scenario.menu_choice is None:
+            scenario.menu_choice = MENU_OPTIONS[option]
+        elif option in BILLING_OPTIONS:
+            scenario.billing_choice = BILLING_OPTIONS[option]
+        return
+    if "self-service" in lowered:
+        scenario.final_choice = "1"
+        return
+    if "agent" in lowered or "transfer" in lowered:
+        scenario.final_choice = "2"
+        return
+
+    labelled = _LABELLED.match(item)
+    if labelled and labelled.group(1).lower() in LABEL_STEPS:
+        _set_answer(scenario, labelled.group(1).lower(), labelled.group(2))
+    elif lowered.startswith("describes") and quoted:
+        _set_answer(scenario, "describes", quoted[0])
+    elif not item.endswith(":"):
+        # Unlabelled prose such as "Wants to add comprehensive coverage"
+        _set_answer(scenario, "describes", item)
+
+
+def parse_scenarios(path=SCENARIO_FILE):
+    """Parse the scenario markdown into Scenario scripts"""
+    with open(path, "r") as f:
+        text = f.read()
+
+    scenarios = []
+    sections = list(_SECTION.finditer(text))
+    for i, match in enumerate(sections):
+        end = sections[i + 1].start() if i + 1 < len(sections) else len(text)
+        body = text[match.end():end]
+        scenario = Scenario(match.group(1))
+
+        for line in _section(body, "User Journey").splitlines():
+            item = _JOURNEY_ITEM.match(line)
+            if item:
+                _parse_journey_item(scenario, item.group(1).strip())
+        if scenario.billing_choice is None:
+            scenario.billing_choice = "3"
+
+        scenario.expected = [
+            line.split("✓", 1)[1].strip()
+            for line in _section(body, "Expected Outcomes").splitlines()
+            if "✓" in line
+        ]
+        scenarios.append(scenario)
+    return scenarios
+
+
+# --- Outcome checks: (pattern over the expectation text, check(session) -> bool) ---
+
+def _value(expectation):
+    match = _BACKTICK.search(expectation)
+    return match.group(1) if match else None
+
+
+def _user_turns(session):
+    return sum(1 for message in session.conversation_history if message["role"] == "user")
+
+
+CHECKS = [
+    (r"^Intent( correctly identified)?:", lambda s, e: s.intent == _value(e)),
+    (r"^Verification status:", lambda s, e: s.verified == (_value(e) == "true")),
+    (r"^KB retrieved: `", lambda s, e: _value(e) in s.retrieved_docs),
+    (r"^Sentiment:", lambda s, e: s.sentiment == _value(e)),
+    (r"^Non-urgent sentiment", lambda s, e: s.sentiment != "urgent"),
+    (r"^Billing type:", lambda s, e: s.incident_details.get("billing_type") == _value(e)),
+    (r"^Steps tried: \"", lambda s, e: _QUOTED.search(e).group(1) in s.steps_tried),
+    (r"^Steps tried: Photos", lambda s, e: "Took photos of damage" in s.steps_tried),
+    (r"^Self-service attempt tracked", lambda s, e: "Attempted self-service completion" in s.steps_tried),
+    (r"^Reason captured", lambda s, e: bool(s.incident_details.get("arrangement_reason"))),
+    (r"^Location captured", lambda s, e: bool(s.incident_details.get("location"))),
+    (r"^Handoff summary clearly shows \"✗ NO\"", lambda s, e: "Verified: ✗ NO" in s.generate_handoff_summary()),
+    (r"^Conversation turns:", lambda s, e: _in_range(_user_turns(s), _TURN_RANGE.search(e))),
+]
+CHECKS = [(re.compile(pattern), check) for pattern, check in CHECKS]
+
+
+def _in_range(value, match):
+    return match is not None and int(match.group(1)) <= value <= int(match.group(2))
+
+
+def check_outcomes(scenario, session):
+    """Return (passed, failed, unchecked) expectation lists"""
+    passed, failed, unchecked = [], [], []
+    for expectation in scenario.expected:
+        for pattern, check in CHECKS:
+            if pattern.search(expectation):
+                (passed if check(session, expectation) else failed).append(expectation)
+                break
+        else:
+            unchecked.append(expectation)
+    return passed, failed, unchecked
+
+
+# --- Drivers ---
+
+def load_process_message():
+    """The service's process_message, the same entry point the Gradio app calls"""
+    from service import process_message
+    return process_message, "service.process_message"
+
+
+def script_messages(scenario, engine):
+    """Drive a throwaway session to get the exact message sequence for a scenario"""
+    session_state = engine.new_state()
+    messages = []
+    while session_state["step"] != END_STEP:
+        message = scenario.answer_for(session_state["step"])
+        messages.append(message)
+        engine.advance(session_state, message)
+    return messages
+
+
+def replay_process_message(scenario, process_message):
+    session_state = None
+    history = []
+    for _ in range(50):
+        step = session_state["step"] if session_state else "verification"
+        if step == END_STEP:
+            break
+        message = scenario.answer_for(step)
+        reply, session_state = process_message(message, history, session_state)
+        history.append({"role": "user", "content": message})
+        history.append({"role": "assistant", "content": reply})
+    return session_state["session"]
+
+
+def replay_cli(messages):
+    """Run main.main() with scripted input(); returns (captured transcript, the CLI's session)"""
+    import main as cli
+
+    script = iter(messages)
+    original_input = builtins.input
+    builtins.input = lambda prompt="": next(script)
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            session = cli.main()
+    finally:
+        builtins.input = original_input
+    return output.getvalue(), session
+
+
+def run_replay(args):
+    kb = KnowledgeBase()
+    engine = DialogEngine(kb, CallSession)
+    process_message, driver = load_process_message()
+    scenarios = parse_scenarios(args.scenarios)
+    failures = 0
+
+    print(f"Replaying {len(scenarios)} scenarios through {driver} and the CLI\n")
+    for scenario in scenarios:
+        session = replay_process_message(scenario, process_message)
+        passed, failed, unchecked = check_outcomes(scenario, session)
+
+        messages = script_messages(scenario, engine)
+        transcript, cli_session = replay_cli(messages)
+        if "AGENT HANDOFF SUMMARY" not in transcript:
+            failed.append("CLI flow reached the handoff summary")
+        _, cli_failed, _ = check_outcomes(scenario, cli_session)
+        failed.extend(f"{expectation} (CLI)" for expectation in cli_failed)
+        failures += len(failed)
+
+        status = "PASS" if not failed else "FAIL"
+        print(f"[{status}] {scenario.title}  ({len(messages)} caller turns)")
+        for expectation in failed:
+            print(f"    ✗ {expectation}")
+        if args.verbose:
+            for expectation in passed:
+                print(f"    ✓ {expectation}")
+            for expectation in unchecked:
+                print(f"    · {expectation} (not checked)")
+        print(f"    {len(passed)} passed, {len(failed)} failed, {len(unchecked)} not checked automatically")
+
+    print(f"\n{'All scenarios passed' if not failures else f'{failures} expectation(s) failed'}")
+    return 1 if failures else 0
+
+
+# --- Load test ---
+
+_FILLER_WORDS = ("um", "so", "well", "uh")
+
+
+def vary(rng, message):
+    """Randomize free-text answers the way real callers do; menu digits stay as they are"""
+    if len(message) <= 2 or message.startswith("POL"):
+        return message
+    if rng.random() < 0.3:
+        message = f"{rng.choice(_FILLER_WORDS)} {message}"
+    if rng.random() < 0.3:
+        message = message.lower()
+    return message
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def _caller(engine, scripts, rng, calls, latencies, sessions, think_time):
+    while calls:
+        calls.pop()
+        messages = rng.choice(scripts)
+        if rng.random() < 0.2:
+            messages = messages[:-1] + ["2" if messages[-1] == "1" else "1"]
+        session_state = engine.new_state()
+        for message in messages:
+            message = vary(rng, message)
+            start = time.perf_counter()
+            engine.advance(session_state, message)
+            latencies.append(time.perf_counter() - start)
+            if think_time:
+                await asyncio.sleep(rng.uniform(0, think_time))
+            else:
+                await asyncio.sleep(0)
+        sessions.append(session_state["session"])
+
+
+async def _run_load(engine, scripts, args):
+    rng = random.Random(args.seed)
+    calls = list(range(args.calls))
+    latencies = []
+    sessions = []
+    callers = [
+        _caller(engine, scripts, random.Random(rng.random()), calls, latencies, sessions, args.think_time)
+        for _ in range(args.callers)
+    ]
+    start = time.perf_counter()
+    await asyncio.gather(*callers)
+    return time.perf_counter() - start, latencies, sessions
+
+
+def run_load(args):
+    kb = KnowledgeBase()
+    engine = DialogEngine(kb, CallSession)
+    scripts = [script_messages(scenario, engine) for scenario in parse_scenarios(args.scenarios)]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    elapsed, latencies, sessions = asyncio.run(_run_load(engine, scripts, args))
+    session_bytes = (tracemalloc.get_traced_memory()[0] - before) / max(len(sessions), 1)
+    tracemalloc.stop()
+
+    latencies.sort()
+    ms = 1000.0
+    print(f"callers:            {args.callers} concurrent")
+    print(f"calls:              {len(sessions)} ({len(latencies)} turns) in {elapsed:.2f}s")
+    print(f"throughput:         {len(sessions) / elapsed:,.0f} calls/s, {len(latencies) / elapsed:,.0f} turns/s")
+    print(f"turn latency:       p50 {percentile(latencies, 50) * ms:.3f} ms, "
+          f"p95 {percentile(latencies, 95) * ms:.3f} ms, p99 {percentile(latencies, 99) * ms:.3f} ms")
+    print(f"memory per session: {session_bytes:,.0f} bytes (tracemalloc, includes latency samples)")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=SCENARIO_FILE)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    replay = sub.add_parser("replay", help="replay every scenario and check expected outcomes")
+    replay.add_argument("-v", "--verbose", action="store_true")
+
+    load = sub.add_parser("load", help="concurrent synthetic callers")
+    load.add_argument("--callers", type=int, default=100)
+    load.add_argument("--calls", type=int, default=2000)
+    load.add_argument("--seed", type=int, default=0)
+    load.add_argument("--think-time", type=float, default=0.0,
+                      help="max random pause between a caller's turns, in seconds")
+
+    args = parser.parse_args()
+    sys.exit(run_replay(args) if args.command == "replay" else run_load(args))
+
+
+if __name__ == "__main__":
+    main()
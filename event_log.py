@@ -0,0 +1,254 @@
+"""Append-only, crash-safe log of call events.
+
+Every CallSession change made through its methods (start, add_message,
+update, set_detail, add_step, add_retrieved_doc) becomes one frame:
+
+    uint32 payload length | uint32 crc32(payload) | payload
+    payload = uint8 kind | float64 timestamp | uint8 id length | session id | body
+
+The body is the role code and UTF-8 text for messages, or a short key
+plus compact JSON for updates and details. Frames are buffered in memory
+and written by a background thread, one write and one fsync per
+interval (group commit), so a turn never waits on the disk. A write
+that would push a segment past `segment_bytes` starts the next one. A torn frame at the
+end of the last segment is detected by its length or CRC and ignored.
+
+    python event_log.py LOG_DIR                # per-kind event counts
+    python event_log.py LOG_DIR SESSION_ID     # replay one call, print its handoff
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+
+from session import ROLES, ROLE_CODES, CallSession
+
+
+START, MESSAGE, UPDATE, DETAIL, STEP, DOC = range(6)
+KINDS = ("start", "message", "update", "detail", "step", "doc")
+
+_FRAME = struct.Struct("<II")
+_HEAD = struct.Struct("<BdB")
+_SHORT = struct.Struct("<B")
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+SEGMENT_PREFIX = "events-"
+SEGMENT_SUFFIX = ".log"
+
+
+def encode_event(kind, session_id, body, timestamp=None):
+    sid = session_id.encode("utf-8")
+    payload = _HEAD.pack(kind, time.time() if timestamp is None else timestamp, len(sid)) + sid + body
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _keyed(key, value):
+    key = key.encode("utf-8")
+    return _SHORT.pack(len(key)) + key + _dumps(value).encode("utf-8")
+
+
+class EventLog:
+    """Writer side: CallSession calls the record_* methods through its `events` slot"""
+
+    def __init__(self, log_dir, segment_bytes=64 * 1024 * 1024, flush_interval=0.05,
+                 max_buffer_bytes=1024 * 1024):
+        self.log_dir = log_dir
+        self.segment_bytes = segment_bytes
+        self.flush_interval = flush_interval
+        self.max_buffer_bytes = max_buffer_bytes
+        os.makedirs(log_dir, exist_ok=True)
+
+        self.buffer = bytearray()
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+        segments = list_segments(log_dir)
+        self.segment_index = _segment_number(segments[-1]) if segments else 0
+        if segments:
+            # Cut a frame torn by a crash, or frames appended after it would be unreachable
+            path = os.path.join(log_dir, segments[-1])
+            valid = _valid_length(path)
+            if valid < os.path.getsize(path):
+                os.truncate(path, valid)
+        self.file = None
+        self._open_segment(self.segment_index)
+        self._thread = threading.Thread(target=self._run, name="event-log-writer", daemon=True)
+        self._thread.start()
+
+    def _open_segment(self, index):
+        if self.file is not None:
+            self.file.close()
+        self.segment_index = index
+        path = os.path.join(self.log_dir, f"{SEGMENT_PREFIX}{index:08d}{SEGMENT_SUFFIX}")
+        self.file = open(path, "ab")
+        self.segment_size = self.file.tell()
+
+    def _append(self, frame):
+        with self.lock:
+            self.buffer += frame
+            full = len(self.buffer) >= self.max_buffer_bytes
+        if full:
+            self._wake.set()
+
+    def record_start(self, session_id):
+        self._append(encode_event(START, session_id, b""))
+
+    def record_message(self, session_id, role, content, timestamp):
+        body = _SHORT.pack(ROLE_CODES[role]) + content.encode("utf-8")
+        self._append(encode_event(MESSAGE, session_id, body, timestamp))
+
+    def record_update(self, session_id, key, value):
+        self._append(encode_event(UPDATE, session_id, _keyed(key, value)))
+
+    def record_detail(self, session_id, key, value):
+        self._append(encode_event(DETAIL, session_id, _keyed(key, value)))
+
+    def record_step(self, session_id, step):
+        self._append(encode_event(STEP, session_id, step.encode("utf-8")))
+
+    def record_doc(self, session_id, doc_name):
+        self._append(encode_event(DOC, session_id, doc_name.encode("utf-8")))
+
+    def flush(self):
+        """Write and fsync everything buffered so far (one group commit)"""
+        with self.write_lock:
+            with self.lock:
+                data, self.buffer = self.buffer, bytearray()
+            if not data:
+                return 0
+            if self.segment_size and self.segment_size + len(data) > self.segment_bytes:
+                self._open_segment(self.segment_index + 1)
+            self.file.write(data)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.segment_size += len(data)
+            return len(data)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"[EVENT LOG] Write failed: {e}")
+
+    def close(self):
+        """Stop the writer and commit what is still buffered; safe to call twice"""
+        if self.file.closed:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        self.file.close()
+
+
+def _segment_number(name):
+    return int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+
+def list_segments(log_dir):
+    return sorted(name for name in os.listdir(log_dir)
+                  if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX))
+
+
+def _valid_length(path):
+    """Byte length of the intact frames at the start of a segment"""
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset + _FRAME.size <= len(data):
+        length, crc = _FRAME.unpack_from(data, offset)
+        start = offset + _FRAME.size
+        if start + length > len(data) or zlib.crc32(data[start:start + length]) != crc:
+            break
+        offset = start + length
+    return offset
+
+
+def read_segment(path, session_id=None):
+    """Yield (kind, timestamp, session_id, body) per frame; stops at a torn or corrupt tail"""
+    if os.path.getsize(path) == 0:
+        return
+    wanted = session_id.encode("utf-8") if session_id is not None else None
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        offset, end = 0, len(buf)
+        while offset + _FRAME.size <= end:
+            length, crc = _FRAME.unpack_from(buf, offset)
+            start = offset + _FRAME.size
+            if start + length > end:
+                break
+            kind, timestamp, sid_len = _HEAD.unpack_from(buf, start)
+            sid_start = start + _HEAD.size
+            sid = buf[sid_start:sid_start + sid_len]
+            if wanted is None or sid == wanted:
+                if zlib.crc32(buf[start:start + length]) != crc:
+                    break
+                yield kind, timestamp, sid.decode("utf-8"), buf[sid_start + sid_len:start + length]
+            offset = start + length
+
+
+def read_events(log_dir, session_id=None):
+    """Yield every event in the log, oldest first, optionally for one session only"""
+    for name in list_segments(log_dir):
+        yield from read_segment(os.path.join(log_dir, name), session_id)
+
+
+def _decode_keyed(body):
+    key_len = body[0]
+    return body[1:1 + key_len].decode("utf-8"), json.loads(body[1 + key_len:])
+
+
+def replay(log_dir, session_id, session_factory=CallSession):
+    """Rebuild a CallSession from its logged events, or None if it has none"""
+    session = None
+    for kind, timestamp, sid, body in read_events(log_dir, session_id):
+        if session is None:
+            session = session_factory()
+            session.session_id = sid
+            session.handoff.session_id = sid
+        if kind == MESSAGE:
+            session.add_message(ROLES[body[0]], body[1:].decode("utf-8"), timestamp)
+        elif kind == UPDATE:
+            session.update(*_decode_keyed(body))
+        elif kind == DETAIL:
+            session.set_detail(*_decode_keyed(body))
+        elif kind == STEP:
+            session.add_step(body.decode("utf-8"))
+        elif kind == DOC:
+            session.add_retrieved_doc(body.decode("utf-8"))
+    return session
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python event_log.py LOG_DIR [SESSION_ID]")
+        sys.exit(1)
+    log_dir = sys.argv[1]
+    if len(sys.argv) > 2:
+        session = replay(log_dir, sys.argv[2])
+        if session is None:
+            print(f"No events for {sys.argv[2]}")
+            sys.exit(1)
+        print(session.generate_handoff_summary())
+        return
+
+    counts = [0] * len(KINDS)
+    sessions = set()
+    for kind, _, sid, _ in read_events(log_dir):
+        counts[kind] += 1
+        sessions.add(sid)
+    print(f"{len(sessions)} sessions")
+    for kind, count in zip(KINDS, counts):
+        print(f"  {kind:8} {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+import csv
+import io
+import json
+import sys
+
+
+HANDOFF_TEMPLATE = """
+========================================
+AGENT HANDOFF SUMMARY
+========================================
+Session ID: {session_id}
+Caller: {caller}
+Verified: {verified}
+
+CUSTOMER GOAL:
+{goal}
+
+ISSUE DESCRIPTION:
+{issue}
+{incident_info}
+STEPS ATTEMPTED:
+{steps}
+
+RETRIEVED KNOWLEDGE BASE ARTICLES:
+{docs}
+
+CONVERSATION TURNS: {turns}
+SENTIMENT: {sentiment}
+
+RECOMMENDED NEXT ACTION:
+[Agent to determine based on above context]
+========================================
+"""
+
+# Bound once so rendering skips the attribute lookup on every call
+_render_template = HANDOFF_TEMPLATE.format_map
+
+# Column order for the structured formats
+FIELDS = (
+    "session_id",
+    "caller_id",
+    "verified",
+    "intent",
+    "issue_description",
+    "incident_details",
+    "steps_tried",
+    "retrieved_docs",
+    "conversation_turns",
+    "sentiment",
+)
+
+
+def _incident_block(incident_details):
+    if not incident_details:
+        return ""
+    return "\nINCIDENT DETAILS:\n" + "".join([f"  {k}: {v}\n" for k, v in incident_details.items()])
+
+
+def _bullets(items):
+    return "\n".join(["  - " + item for item in items]) if items else "  None"
+
+
+def _fill(session_id, caller_id, verified, intent, issue_description,
+          incident_info, steps, docs, turns, sentiment):
+    return _render_template({
+        "session_id": session_id,
+        "caller": caller_id or "Unknown",
+        "verified": "✓ YES" if verified else "✗ NO",
+        "goal": intent or "Not determined",
+        "issue": issue_description or "No details provided",
+        "incident_info": incident_info,
+        "steps": steps,
+        "docs": docs,
+        "turns": turns,
+        "sentiment": sentiment,
+    })
+
+
+class HandoffRecord:
+    """Typed handoff payload kept current as the call progresses.
+
+    CallSession updates it on every field update, history message,
+    incident detail, step and retrieved article. The text fragments for
+    the list sections are extended in place, and the rendered summary is
+    cached until the next change. An agent desktop can therefore pull a
+    partial handoff mid-call without anything being recomputed from the
+    history.
+    """
+
+    __slots__ = FIELDS + ("_incident_info", "_steps", "_docs", "_text")
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.caller_id = None
+        self.verified = False
+        self.intent = None
+        self.issue_description = ""
+        self.incident_details = {}
+        self.steps_tried = []
+        self.retrieved_docs = []
+        self.conversation_turns = 0
+        self.sentiment = "neutral"
+        self._incident_info = ""
+        self._steps = "  None"
+        self._docs = "  None"
+        self._text = None
+
+    @classmethod
+    def from_session(cls, session):
+        record = cls(session.session_id)
+        for field in FIELDS:
+            if field != "conversation_turns":
+                setattr(record, field, getattr(session, field))
+        record.conversation_turns = session.turn_count
+        record._incident_info = _incident_block(record.incident_details)
+        record._steps = _bullets(record.steps_tried)
+        record._docs = _bullets(record.retrieved_docs)
+        return record
+
+    def set(self, field, value):
+        setattr(self, field, value)
+        if field == "incident_details":
+            self._incident_info = _incident_block(value)
+        elif field == "steps_tried":
+            self._steps = _bullets(value)
+        elif field == "retrieved_docs":
+            self._docs = _bullets(value)
+        self._text = None
+
+    def set_detail(self, key, value):
+        is_new = key not in self.incident_details
+        self.incident_details[key] = value
+        if is_new:
+            if not self._incident_info:
+                self._incident_info = "\nINCIDENT DETAILS:\n"
+            self._incident_info += f"  {key}: {value}\n"
+        else:
+            self._incident_info = _incident_block(self.incident_details)
+        self._text = None
+
+    def add_step(self, step):
+        """Record a step; the list itself is shared with the session, which appends to it"""
+        self._steps = "  - " + step if self._steps == "  None" else self._steps + "\n  - " + step
+        self._text = None
+
+    def add_doc(self, doc_name):
+        self._docs = "  - " + doc_name if self._docs == "  None" else self._docs + "\n  - " + doc_name
+        self._text = None
+
+    def count_turn(self):
+        self.conversation_turns += 1
+        self._text = None
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in FIELDS}
+
+    def render(self):
+        """The handoff summary text, cached until the record next changes"""
+        if self._text is None:
+            self._text = _fill(self.session_id, self.caller_id, self.verified, self.intent,
+                               self.issue_description, self._incident_info, self._steps,
+                               self._docs, self.conversation_turns, self.sentiment)
+        return self._text
+
+
+def handoff_record(session):
+    """The handoff as a flat dict of FIELDS"""
+    return session.handoff.to_dict()
+
+
+def render_text(record):
+    """Render a handoff record dict as the agent-facing text block"""
+    return _fill(record["session_id"], record["caller_id"], record["verified"], record["intent"],
+                 record["issue_description"], _incident_block(record["incident_details"]),
+                 _bullets(record["steps_tried"]), _bullets(record["retrieved_docs"]),
+                 record["conversation_turns"], record["sentiment"])
+
+
+# --- Batch writers: each takes a list of records and returns one string ---
+
+def _text_batch(records):
+    return "".join([render_text(record) for record in records])
+
+
+def _jsonl_batch(records):
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    return "".join([dumps(record) + "\n" for record in records])
+
+
+def _csv_batch(records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([
+        [
+            record["session_id"], record["caller_id"] or "", record["verified"], record["intent"] or "",
+            record["issue_description"], json.dumps(record["incident_details"], ensure_ascii=False),
+            "; ".join(record["steps_tried"]), "; ".join(record["retrieved_docs"]),
+            record["conversation_turns"], record["sentiment"],
+        ]
+        for record in records
+    ])
+    return buffer.getvalue()
+
+
+def _columnar_batch(records):
+    """One JSON line per batch holding a column array per field (a row group)"""
+    columns = {field: [record[field] for record in records] for field in FIELDS}
+    return json.dumps({"rows": len(records), "columns": columns}, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+BATCH_WRITERS = {
+    "text": _text_batch,
+    "jsonl": _jsonl_batch,
+    "csv": _csv_batch,
+    "columnar": _columnar_batch,
+}
+
+
+def _sessions(items):
+    for item in items:
+        yield item["session"] if isinstance(item, dict) else item
+
+
+def _batches(sessions, batch_size):
+    batch = []
+    for session in _sessions(sessions):
+        batch.append(handoff_record(session))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _export_parquet(sessions, path, batch_size):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    written = 0
+    try:
+        for batch in _batches(sessions, batch_size):
+            columns = {field: [record[field] for record in batch] for field in FIELDS}
+            columns["incident_details"] = [json.dumps(d, ensure_ascii=False) for d in columns["incident_details"]]
+            table = pa.table(columns)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            written += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return written
+
+
+def export_handoffs(sessions, out, fmt="text", batch_size=1000):
+    """Stream handoff summaries for many sessions to `out`.
+
+    `sessions` is any iterable of CallSession objects or session_state
+    dicts, consumed lazily. `out` is a path or a writable text stream
+    (for a socket, pass sock.makefile("w", encoding="utf-8")). Records are
+    rendered `batch_size` at a time and each batch is one write, so memory
+    stays flat no matter how many sessions are exported. "parquet" needs
+    pyarrow and a path. Returns the number of sessions written.
+    """
+    if fmt == "parquet":
+        return _export_parquet(sessions, out, batch_size)
+    if fmt not in BATCH_WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    if isinstance(out, str):
+        with open(out, "w", encoding="utf-8", newline="") as f:
+            return export_handoffs(sessions, f, fmt, batch_size)
+
+    render_batch = BATCH_WRITERS[fmt]
+    if fmt == "csv":
+        out.write(",".join(FIELDS) + "\r\n")
+    written = 0
+    for batch in _batches(sessions, batch_size):
+        out.write(render_batch(batch))
+        written += len(batch)
+    out.flush()
+    return written
+
+
+def main():
+    """Export every session in a SQLite session store: handoff.py DB OUT [FORMAT]"""
+    from session_store import SQLiteBackend, decode_state
+
+    if len(sys.argv) < 3:
+        print("Usage: python handoff.py sessions.db OUT [text|jsonl|csv|columnar|parquet]")
+        sys.exit(1)
+    db_path, out = sys.argv[1], sys.argv[2]
+    fmt = sys.argv[3] if len(sys.argv) > 3 else "jsonl"
+    backend = SQLiteBackend(db_path)
+    sessions = (decode_state(data) for data in backend.scan())
+    count = export_handoffs(sessions, sys.stdout if out == "-" else out, fmt)
+    print(f"[EXPORT] Wrote {count} handoff summaries to {out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import asyncio
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from retrieval import HashingEmbedder, tokenize
+
+
+# Seed utterances per intent; each intent's centroid is the mean of their embeddings
+TRAINING_UTTERANCES = {
+    "file_claim": [
+        "I was in an accident", "I need to file a claim", "someone hit my car",
+        "I got rear-ended at a stoplight", "my car was damaged", "hail damage on my car",
+        "fender bender in a parking lot", "report a collision", "my windshield is cracked",
+        "a tree fell on my car", "my car was stolen", "the other driver ran a red light",
+        "somebody crashed into me", "bumper is crumpled", "car accident on the freeway",
+    ],
+    "billing": [
+        "I want to pay my bill", "make a payment", "I need a payment extension",
+        "can I get more time to pay", "why is my bill so high", "question about a charge on my bill",
+        "my payment is late", "set up autopay", "update my credit card",
+        "I was charged twice", "payment arrangement", "how much do I owe",
+        "what is my balance", "my bill is due", "refund",
+    ],
+    "roadside": [
+        "I have a flat tire", "my car won't start", "I need a tow truck",
+        "I locked my keys in the car", "dead battery need a jump start", "I ran out of gas",
+        "I'm stuck on the highway", "engine makes a clicking sound", "my car broke down",
+        "car is stuck in a ditch", "tow my car", "battery died",
+        "keys locked inside", "tire blew out", "need roadside help",
+    ],
+    "policy_change": [
+        "add a driver to my policy", "change my coverage", "add comprehensive coverage",
+        "I bought a new car", "update my address", "remove a vehicle from my policy",
+        "increase my deductible", "add my teenager to the policy", "cancel my policy",
+        "lower my premium", "add collision coverage", "change my policy",
+        "add a new vehicle", "change my address", "update my policy",
+    ],
+}
+
+
+class IntentClassifier:
+    """Nearest-centroid intent classifier over hashed word n-grams.
+
+    Runs fully offline. The centroids are one float32 matrix, so a batch of
+    utterances is classified with a single matrix product. Results are
+    memoized per normalized utterance in an LRU cache, since most callers
+    say one of a few common things.
+    """
+
+    def __init__(self, training=TRAINING_UTTERANCES, embedder=None, min_score=0.15,
+                 cache_size=50_000, max_batch=64, max_delay=0.001):
+        self.embedder = embedder or HashingEmbedder(dim=1024, char_ngrams=4)
+        self.min_score = min_score
+        self.intents = list(training)
+        centroids = np.stack([self.embedder.encode(training[intent]).mean(axis=0) for intent in self.intents])
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = []
+        self._flush_handle = None
+
+    @staticmethod
+    def normalize(utterance):
+        return " ".join(tokenize(utterance))
+
+    def _cache_get(self, key, count=True):
+        """Cached result for a normalized key; `count` records the lookup in hits/misses"""
+        with self.cache_lock:
+            result = self.cache.get(key)
+            if result is not None:
+                self.cache.move_to_end(key)
+            if count:
+                if result is not None:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            return result
+
+    def _cache_put(self, key, result):
+        with self.cache_lock:
+            self.cache[key] = result
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def _predict(self, keys):
+        scores = self.embedder.encode(keys) @ self.centroids.T
+        best = scores.argmax(axis=1)
+        results = []
+        for row, index in enumerate(best):
+            score = float(scores[row, index])
+            intent = self.intents[index] if score >= self.min_score else None
+            results.append((intent, score))
+        return results
+
+    def classify_batch(self, utterances):
+        """Classify many utterances in one vectorized call; returns [(intent or None, score)]"""
+        return self._classify_keys([self.normalize(u) for u in utterances])
+
+    def _classify_keys(self, keys, count=True):
+        results = [None] * len(keys)
+        missing = {}
+        for i, key in enumerate(keys):
+            if not key:
+                results[i] = (None, 0.0)
+                continue
+            cached = self._cache_get(key, count)
+            if cached is not None:
+                results[i] = cached
+            else:
+                missing.setdefault(key, []).append(i)
+
+        if missing:
+            for key, result in zip(missing, self._predict(list(missing))):
+                self._cache_put(key, result)
+                for i in missing[key]:
+                    results[i] = result
+        return results
+
+    def classify(self, utterance):
+        """Return the intent for one utterance, or None when nothing scores above min_score"""
+        return self.classify_batch([utterance])[0][0]
+
+    async def classify_async(self, utterance):
+        """Classify on the event loop, micro-batching concurrent callers.
+
+        Cache hits return immediately. Misses are queued and the queue is
+        classified in one call once max_batch requests are waiting or
+        max_delay has passed since the first one.
+        """
+        key = self.normalize(utterance)
+        cached = self._cache_get(key) if key else (None, 0.0)
+        if cached is not None:
+            return cached[0]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # Queued by key: the lookup above already counted the miss
+        self._queue.append((key, future))
+        if len(self._queue) >= self.max_batch:
+            self._flush_queue()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_delay, self._flush_queue)
+        return (await future)[0]
+
+    def _flush_queue(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        queue, self._queue = self._queue, []
+        if not queue:
+            return
+        try:
+            results = self._classify_keys([key for key, _ in queue], count=False)
+        except Exception as e:
+            for _, future in queue:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(queue, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
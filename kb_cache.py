@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from kb_corpus import Corpus
+from retrieval import Chunk, chunk_document
+
+
+# Bump whenever the chunking or manifest layout changes
+CACHE_VERSION = 3
+
+
+def default_cache_dir(kb_dir):
+    """The cache lives next to the kb directory, e.g. kb/ -> .kb_cache/"""
+    kb_dir = os.path.abspath(kb_dir)
+    return os.path.join(os.path.dirname(kb_dir), f".{os.path.basename(kb_dir)}_cache")
+
+
+def _atomic_write(path, write):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class EmbeddingCache:
+    """Versioned on-disk cache of KB chunk embeddings and the KB corpus.
+
+    The embedding matrix is stored as a .npy file and the articles as one
+    concatenated corpus file; both are memory-mapped on load, so a warm
+    start copies nothing. The manifest records each article's mtime,
+    size, content hash, offset in the corpus file, header sections and
+    row range. Only added or changed articles are read and re-embedded.
+
+    A `read_only` cache never writes: anything not yet cached is embedded
+    in memory only. Worker processes use this so that one process owns
+    the files.
+    """
+
+    def __init__(self, kb_dir, cache_dir=None, read_only=False):
+        self.kb_dir = kb_dir
+        self.read_only = read_only
+        self.cache_dir = cache_dir or default_cache_dir(kb_dir)
+        self.matrix_path = os.path.join(self.cache_dir, "embeddings.npy")
+        self.manifest_path = os.path.join(self.cache_dir, "manifest.json")
+        self.corpus_path = os.path.join(self.cache_dir, "corpus.bin")
+        self.last_stats = {}
+
+    def _read_manifest(self, embedder):
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if (manifest.get("version") != CACHE_VERSION
+                or manifest.get("embedder") != embedder.name
+                or manifest.get("dim") != embedder.dim):
+            return None
+        return manifest
+
+    def _open_matrix(self, rows, dim):
+        if rows == 0:
+            return np.zeros((0, dim), dtype=np.float32)
+        matrix = np.load(self.matrix_path, mmap_mode="r")
+        if matrix.shape != (rows, dim) or matrix.dtype != np.float32:
+            raise ValueError(f"cached matrix shape {matrix.shape} does not match manifest")
+        return matrix
+
+    def load(self, embedder):
+        """Return (corpus, chunks, matrix) for the kb directory, embedding only what changed.
+
+        An article whose mtime and size match the manifest is not read at
+        all: its chunks come from the manifest and its text from the
+        mapped corpus file, so a warm start only stats the kb directory.
+        """
+        manifest = self._read_manifest(embedder)
+        old_files = manifest["files"] if manifest else {}
+        old_matrix = None
+        old_corpus = None
+        if manifest:
+            try:
+                old_matrix = self._open_matrix(manifest["rows"], embedder.dim)
+                old_corpus = self._open_corpus(sum(entry["size"] for entry in old_files.values()))
+            except (OSError, ValueError) as e:
+                print(f"[KB] Ignoring embedding cache: {e}")
+                old_files = {}
+
+        raws = {}
+        spans = {}
+        files = {}
+        chunks = []
+        offset = 0
+        reused = {}
+        pending = []
+        dirty = False
+
+        for filename in sorted(os.listdir(self.kb_dir)):
+            if not filename.endswith('.md'):
+                continue
+            filepath = os.path.join(self.kb_dir, filename)
+            stat = os.stat(filepath)
+            entry = {"path": filepath, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "offset": offset}
+            old = old_files.get(filename)
+            if old and old["mtime_ns"] == entry["mtime_ns"] and old["size"] == entry["size"]:
+                entry["sha256"] = old["sha256"]
+                entry["chunks"] = old["chunks"]
+                doc_chunks = [Chunk(filename, heading, level, tuple(path), offset + start, offset + end)
+                              for heading, level, path, start, end in old["chunks"]]
+            else:
+                with open(filepath, 'rb') as f:
+                    raw = f.read()
+                raws[filename] = raw
+                # The bytes actually read, in case the file changed since the stat
+                entry["size"] = len(raw)
+                entry["sha256"] = hashlib.sha256(raw).hexdigest()
+                doc_chunks = chunk_document(filename, raw, offset)
+                entry["chunks"] = [[c.heading, c.level, list(c.path), c.start - offset, c.end - offset]
+                                   for c in doc_chunks]
+                dirty = True
+            spans[filename] = (offset, offset + entry["size"])
+            offset += entry["size"]
+
+            if (old and old["sha256"] == entry["sha256"]
+                    and old["row_end"] - old["row_start"] == len(doc_chunks)):
+                reused[filename] = (old["row_start"], old["row_end"])
+            else:
+                pending.append(filename)
+
+            entry["row_start"] = len(chunks)
+            chunks.extend(doc_chunks)
+            entry["row_end"] = len(chunks)
+            files[filename] = entry
+
+        removed = [name for name in old_files if name not in files]
+        self.last_stats = {"reused": len(reused), "embedded": len(pending), "removed": len(removed)}
+
+        unchanged = (not pending and not removed and old_matrix is not None
+                     and all(files[name]["row_start"] == reused[name][0]
+                             and files[name]["offset"] == old_files[name]["offset"] for name in files))
+        if unchanged:
+            if dirty and not self.read_only:
+                self._write_manifest(files, len(chunks), embedder)
+            return Corpus(old_corpus.buffer, spans, chunks), chunks, old_matrix
+
+        matrix = np.empty((len(chunks), embedder.dim), dtype=np.float32)
+        for filename, (start, end) in reused.items():
+            entry = files[filename]
+            matrix[entry["row_start"]:entry["row_end"]] = old_matrix[start:end]
+
+        parts = []
+        for filename in spans:
+            raw = raws.get(filename)
+            if raw is None:
+                # Unchanged since the last cache write: copy it out of the old corpus file
+                old = old_files[filename]
+                raw = bytes(old_corpus.view[old["offset"]:old["offset"] + old["size"]])
+            parts.append(raw)
+        pending_rows = [(files[name]["row_start"], files[name]["row_end"]) for name in pending]
+        corpus = Corpus(b"".join(parts), spans, chunks)
+        texts = [corpus.text(c.start, c.end) for start, end in pending_rows for c in chunks[start:end]]
+        if texts:
+            embedded = embedder.encode(texts)
+            offset = 0
+            for start, end in pending_rows:
+                matrix[start:end] = embedded[offset:offset + end - start]
+                offset += end - start
+
+        if self.read_only:
+            return corpus, chunks, matrix
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Corpus before manifest: a manifest on disk always describes the corpus file next to it
+            _atomic_write(self.corpus_path, lambda f: f.write(corpus.buffer))
+            _atomic_write(self.matrix_path, lambda f: np.save(f, matrix))
+            self._write_manifest(files, len(chunks), embedder)
+            matrix = self._open_matrix(len(chunks), embedder.dim)
+            corpus = Corpus.open(self.corpus_path, spans, chunks)
+        except OSError as e:
+            print(f"[KB] Could not write embedding cache: {e}")
+        return corpus, chunks, matrix
+
+    def _open_corpus(self, size):
+        """Map the cached corpus file, checking it has the size the manifest describes"""
+        if os.path.getsize(self.corpus_path) != size:
+            raise ValueError("cached corpus does not match manifest")
+        return Corpus.open(self.corpus_path, {}, [])
+
+    def _write_manifest(self, files, rows, embedder):
+        manifest = {
+            "version": CACHE_VERSION,
+            "embedder": embedder.name,
+            "dim": embedder.dim,
+            "rows": rows,
+            "files": files,
+        }
+        _atomic_write(self.manifest_path, lambda f: f.write(json.dumps(manifest, indent=1).encode("utf-8")))
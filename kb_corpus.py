@@ -0,0 +1,81 @@
+import mmap
+import os
+from collections.abc import Mapping
+
+from retrieval import chunk_document
+
+
+class Corpus(Mapping):
+    """Every KB article in one contiguous UTF-8 buffer, read as {doc_name: text}.
+
+    The buffer is normally an mmap of the corpus file in the embedding
+    cache, so article text is paged in by the OS and shared between
+    worker processes instead of being held as Python strings. Articles
+    are decoded on access. `chunks` are the header sections of every
+    article (retrieval.Chunk) with byte offsets into the buffer, and
+    `section` returns one as a memoryview without copying.
+    """
+
+    def __init__(self, buffer, spans, chunks=None):
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        # {doc_name: (start, end)} byte ranges, in buffer order
+        self.spans = spans
+        if chunks is None:
+            chunks = []
+            for doc_name, (start, end) in spans.items():
+                chunks.extend(chunk_document(doc_name, self.view[start:end], start))
+        self.chunks = chunks
+
+    @classmethod
+    def from_files(cls, kb_dir):
+        """Read every .md file in kb_dir into an in-memory buffer"""
+        parts = []
+        spans = {}
+        offset = 0
+        for filename in sorted(os.listdir(kb_dir)):
+            if filename.endswith('.md'):
+                with open(os.path.join(kb_dir, filename), 'rb') as f:
+                    raw = f.read()
+                parts.append(raw)
+                spans[filename] = (offset, offset + len(raw))
+                offset += len(raw)
+        return cls(b"".join(parts), spans)
+
+    @classmethod
+    def open(cls, path, spans, chunks=None):
+        """Map a corpus file written by EmbeddingCache"""
+        if os.path.getsize(path) == 0:
+            return cls(b"", spans, chunks)
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer, spans, chunks)
+
+    def __getitem__(self, doc_name):
+        start, end = self.spans[doc_name]
+        return str(self.view[start:end], "utf-8")
+
+    def __iter__(self):
+        return iter(self.spans)
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __contains__(self, doc_name):
+        return doc_name in self.spans
+
+    @property
+    def nbytes(self):
+        return len(self.view)
+
+    def article(self, doc_name):
+        """Zero-copy view of one article's bytes"""
+        start, end = self.spans[doc_name]
+        return self.view[start:end]
+
+    def section(self, chunk):
+        """Zero-copy view of one chunk's bytes"""
+        return self.view[chunk.start:chunk.end]
+
+    def text(self, start, end):
+        return str(self.view[start:end], "utf-8")
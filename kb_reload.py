@@ -0,0 +1,95 @@
+import os
+import threading
+from collections import namedtuple
+
+from bm25 import BM25Index
+from kb_corpus import Corpus
+from retrieval import HashingEmbedder, VectorIndex
+
+
+# One immutable generation of the knowledge base: documents, both article indexes,
+# the rendered-snippet memo and a BM25 index over header sections. KnowledgeBase swaps the whole tuple in a single assignment,
+# so a reader that takes `kb.snapshot` once sees one consistent generation.
+KBSnapshot = namedtuple("KBSnapshot", ["docs", "index", "keyword_index", "snippets", "version",
+                                       "section_index"])
+
+# What a KB with no directory serves: every index is present and empty, so searches find nothing
+EMPTY_SNAPSHOT = KBSnapshot(Corpus(b"", {}), VectorIndex(HashingEmbedder()), BM25Index(), {}, 0,
+                            BM25Index())
+
+
+def kb_signature(kb_dir):
+    """(name, mtime_ns, size) for every markdown file; changes whenever an article does"""
+    try:
+        entries = list(os.scandir(kb_dir))
+    except FileNotFoundError:
+        return ()
+    return tuple(sorted(
+        (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+        for entry in entries if entry.name.endswith(".md") and entry.is_file()
+    ))
+
+
+def file_signature(path):
+    """(mtime_ns, size, inode) of one file; a rename into place always changes it"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return ()
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class KBWatcher:
+    """Polls a KnowledgeBase's directory and reloads it in the background on change.
+
+    The new snapshot is built on the watcher thread while requests keep
+    reading the old one, then swapped in. Reloads are serialized, so at most
+    two generations (the live one and the one being built) are in memory.
+    Polling keeps it dependency-free and works on network mounts, where
+    inotify does not.
+
+    With `follow_cache`, it polls the embedding cache manifest instead.
+    The KB then reloads only after another process (serve.py's parent)
+    has re-embedded the articles and rewritten the cache.
+    """
+
+    def __init__(self, kb, interval=2.0, follow_cache=False):
+        self.kb = kb
+        self.interval = interval
+        if follow_cache:
+            self._signature = lambda: file_signature(kb.cache.manifest_path)
+        else:
+            self._signature = lambda: kb_signature(kb.kb_dir)
+        self.signature = self._signature()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self):
+        """Reload if the directory changed since the last check; returns True if it did"""
+        signature = self._signature()
+        if signature == self.signature:
+            return False
+        self.kb.load_documents()
+        self.signature = signature
+        print(f"[KB] Reloaded {len(self.kb.docs)} documents (version {self.kb.version})")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                # Keep serving the previous snapshot; the next poll retries
+                print(f"[KB] Reload failed, keeping version {self.kb.version}: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="kb-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,204 @@
+import os
+import re
+import threading
+
+from bm25 import BM25Index, reciprocal_rank_fusion
+from kb_cache import EmbeddingCache
+from kb_corpus import Corpus
+from kb_reload import EMPTY_SNAPSHOT, KBSnapshot
+from retrieval import EmbedderUnavailable, HashingEmbedder, VectorIndex, load_embedder
+
+
+INTENT_TO_DOC = {
+    "file_claim": "claim-filing.md",
+    "billing": "billing-payment.md",
+    "roadside": "roadside-assistance.md",
+    "policy_change": "billing-payment.md"
+}
+
+_LETTER = re.compile(r"[A-Za-z]")
+
+
+class KnowledgeBase:
+    """Markdown articles plus their indexes, held as one immutable KBSnapshot.
+
+    load_documents builds a complete new snapshot and swaps it in with a
+    single assignment, so it can run on a KBWatcher thread while requests
+    keep reading the previous generation. Shared by the CLI, the Gradio
+    app, the turn API and the eval harness; `verbose` prints load stats.
+    An optional AnswerCache fronts retrieve whenever there is free text to match.
+    With `read_only_cache` the embedding cache is read but never written,
+    for processes that leave its upkeep to another one. `cache_dir`
+    overrides where it lives (kb_cache.default_cache_dir).
+
+    `docs` is a kb_corpus.Corpus: the articles live in one mmap'd buffer
+    and each header section is a byte range in it, so retrieve can point
+    at the section matching the caller's words rather than the whole article.
+    """
+
+    def __init__(self, kb_dir="kb", embedder=None, min_score=0.1, use_cache=True, verbose=False,
+                 answer_cache=None, section_min_score=0.2, read_only_cache=False, cache_dir=None):
+        self.kb_dir = kb_dir
+        self.min_score = min_score
+        self.section_min_score = section_min_score
+        self.verbose = verbose
+        self.answer_cache = answer_cache
+        self.embedder = embedder or load_embedder()
+        self.cache = EmbeddingCache(kb_dir, cache_dir, read_only_cache) if use_cache else None
+        self.snapshot = EMPTY_SNAPSHOT
+        self.reload_lock = threading.Lock()
+        self.load_documents()
+
+    docs = property(lambda self: self.snapshot.docs)
+    index = property(lambda self: self.snapshot.index)
+    keyword_index = property(lambda self: self.snapshot.keyword_index)
+    snippets = property(lambda self: self.snapshot.snippets)
+    version = property(lambda self: self.snapshot.version)
+
+    def load_documents(self):
+        """Load all markdown files from kb directory into a new snapshot"""
+        if not os.path.exists(self.kb_dir):
+            print(f"Warning: {self.kb_dir} directory not found")
+            return
+
+        with self.reload_lock:
+            try:
+                docs, index = self._build_index()
+            except EmbedderUnavailable as e:
+                print(f"[KB] Could not load {self.embedder.name} ({e}); using hashing embedder")
+                self.embedder = HashingEmbedder()
+                docs, index = self._build_index()
+
+            keyword_index = BM25Index()
+            keyword_index.build(docs)
+            section_index = BM25Index()
+            section_index.build({chunk: docs.text(chunk.start, chunk.end) for chunk in index.chunks})
+            # Rendered snippets are keyed by (doc_name, max_lines); consumers watch `version`
+            self.snapshot = KBSnapshot(docs, index, keyword_index, {}, self.snapshot.version + 1,
+                                       section_index)
+
+        if self.verbose:
+            print(f"[KB] Loaded {len(self.docs)} documents ({len(self.index.chunks)} sections, "
+                  f"{self.docs.nbytes} bytes)\n")
+
+    def _build_index(self):
+        index = VectorIndex(self.embedder)
+        if self.cache:
+            docs, chunks, matrix = self.cache.load(self.embedder)
+            index.set_matrix(docs, chunks, matrix)
+            if self.verbose:
+                stats = self.cache.last_stats
+                print(f"[KB] Embedding cache: {stats['reused']} reused, "
+                      f"{stats['embedded']} embedded, {stats['removed']} removed")
+        else:
+            docs = Corpus.from_files(self.kb_dir)
+            index.build(docs)
+        return docs, index
+
+    def retrieve(self, intent, issue_description=""):
+        """Intent-mapped retrieval, falling back to semantic search over the issue description.
+
+        "content" is a memoryview of the article's UTF-8 bytes in the
+        corpus buffer, and "section" the header section (a retrieval.Chunk)
+        that best matches the description, or None.
+        """
+        snapshot = self.snapshot
+        if self.answer_cache is not None and issue_description and _LETTER.search(issue_description):
+            return self.answer_cache.fetch(intent, issue_description, snapshot.version,
+                                           lambda: self._retrieve(snapshot, intent, issue_description))
+        return self._retrieve(snapshot, intent, issue_description)
+
+    def _retrieve(self, snapshot, intent, issue_description):
+        doc_name = INTENT_TO_DOC.get(intent)
+        if doc_name and doc_name in snapshot.docs:
+            return {
+                "doc_name": doc_name,
+                "content": snapshot.docs.article(doc_name),
+                "relevance": "high",
+                "section": self._best_section(snapshot, doc_name, issue_description)
+            }
+
+        if issue_description:
+            return self._best_match(snapshot, issue_description)
+        return None
+
+    def _best_match(self, snapshot, query):
+        hits = self._search(snapshot, query, k=1)
+        if not hits:
+            return None
+        doc_name, score = hits[0]
+        return {
+            "doc_name": doc_name,
+            "content": snapshot.docs.article(doc_name),
+            "relevance": "medium",
+            "score": score,
+            "section": self._best_section(snapshot, doc_name, query)
+        }
+
+    def _best_section(self, snapshot, doc_name, query):
+        """Keyword match among the article's sections first, then embedding similarity"""
+        if not query or not _LETTER.search(query):
+            # Menu digits say nothing about which section is relevant
+            return None
+        rows = snapshot.index.doc_rows.get(doc_name)
+        if rows is None:
+            return None
+        # section_index keys are the index's chunks in row order, so the article's rows select its sections
+        hits = snapshot.section_index.search(query, k=1, rows=rows)
+        if hits:
+            return hits[0][0]
+        try:
+            hit = snapshot.index.best_chunk(query, doc_name)
+        except EmbedderUnavailable:
+            return None
+        if hit is None or hit[1] < self.section_min_score:
+            return None
+        return hit[0]
+
+    def search(self, query, k=3):
+        """Hybrid search: BM25 and semantic rankings merged by reciprocal-rank fusion"""
+        return self._search(self.snapshot, query, k)
+
+    def _search(self, snapshot, query, k):
+        keyword_hits = snapshot.keyword_index.search(query, k=k * 2)
+        try:
+            vector_hits = [hit for hit in snapshot.index.search_documents(query, k=k * 2)
+                           if hit[1] >= self.min_score]
+        except EmbedderUnavailable:
+            # The matrix came from the cache but the model will not load: keyword ranking only
+            vector_hits = []
+        return reciprocal_rank_fusion(keyword_hits, vector_hits, limit=k)
+
+    def get_snippet(self, doc_name, max_lines=10):
+        """Get a snippet of a document for display"""
+        snapshot = self.snapshot
+        if doc_name not in snapshot.docs:
+            return None
+
+        key = (doc_name, max_lines)
+        snippet = snapshot.snippets.get(key)
+        if snippet is None:
+            lines = snapshot.docs[doc_name].split('\n')
+            snippet = '\n'.join(lines[:max_lines])
+            if len(lines) > max_lines:
+                snippet += "\n\n[... see full article for more details ...]"
+            snapshot.snippets[key] = snippet
+        return snippet
+
+    def get_section(self, section, max_lines=10):
+        """One section's text, cut to max_lines like get_snippet"""
+        snapshot = self.snapshot
+        span = snapshot.docs.spans.get(section.doc_name)
+        if span is None or not span[0] <= section.start < section.end <= span[1]:
+            # Found in a KB generation that has since been swapped out
+            return None
+
+        key = (section.doc_name, section.start, max_lines)
+        snippet = snapshot.snippets.get(key)
+        if snippet is None:
+            lines = snapshot.docs.text(section.start, section.end).strip().split('\n')
+            snippet = '\n'.join(lines[:max_lines])
+            if len(lines) > max_lines:
+                snippet += "\n\n[... see full article for more details ...]"
+            snapshot.snippets[key] = snippet
+        return snippet
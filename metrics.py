@@ -0,0 +1,225 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Upper bounds in seconds: 50µs .. 5s, wide enough for a cached parse and a slow retriever
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class NullMetrics:
+    """Default sink: every call is a no-op, so instrumented code costs one method call"""
+
+    enabled = False
+
+    def observe(self, name, value, **labels):
+        pass
+
+    def inc(self, name, amount=1, **labels):
+        pass
+
+    def time(self, name, **labels):
+        return _NULL_TIMER
+
+    def render(self):
+        return ""
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "labels", "start")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Metrics:
+    """In-process histograms and counters, rendered as Prometheus text.
+
+    Metric names ending in "_seconds" use LATENCY_BUCKETS, everything else
+    observed goes into SIZE_BUCKETS. Series are keyed by name plus sorted
+    label pairs. `labels` are added to every series when rendering (e.g. a
+    worker id, so the series of several processes do not collide).
+    """
+
+    enabled = True
+
+    def __init__(self, prefix="ivr_", labels=None):
+        self.prefix = prefix
+        self.labels = tuple(sorted((labels or {}).items()))
+        self.histograms = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                buckets = LATENCY_BUCKETS if name.endswith("_seconds") else SIZE_BUCKETS
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def time(self, name, **labels):
+        """Context manager observing the elapsed wall time of its block"""
+        return _Timer(self, name, labels)
+
+    def render(self):
+        """All series in the Prometheus text exposition format"""
+        with self.lock:
+            histograms = sorted(
+                (key, list(h.counts), h.sum, h.count, h.buckets) for key, h in self.histograms.items()
+            )
+            counters = sorted(self.counters.items())
+
+        lines = []
+        typed = set()
+        for (name, labels), amount in counters:
+            labels = self.labels + labels
+            metric = self.prefix + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_labels(labels)} {amount}")
+
+        for (name, labels), counts, total, count, buckets in histograms:
+            labels = self.labels + labels
+            metric = self.prefix + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{metric}_bucket{_labels(labels, le=repr(float(bound)))} {cumulative}")
+            lines.append(f"{metric}_bucket{_labels(labels, le='+Inf')} {count}")
+            lines.append(f"{metric}_sum{_labels(labels)} {total}")
+            lines.append(f"{metric}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels, le=None):
+    pairs = list(labels) + ([("le", le)] if le is not None else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def start_http_server(metrics, port, host="0.0.0.0"):
+    """Serve metrics.render() at /metrics from a daemon thread"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def start_periodic_dump(metrics, path, interval=60.0):
+    """Rewrite `path` with the current metrics every `interval` seconds (node_exporter textfile style)"""
+
+    def run():
+        while True:
+            time.sleep(interval)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(metrics.render())
+            os.replace(tmp_path, path)
+
+    thread = threading.Thread(target=run, name="metrics-dump", daemon=True)
+    thread.start()
+    return thread
+
+
+def metrics_from_env():
+    """Metrics() when IVR_METRICS_PORT or IVR_METRICS_FILE is set, else NullMetrics().
+
+    Starts the /metrics endpoint and/or the periodic file dump as configured.
+    In a serve.py worker (IVR_WORKER_ID=N) the endpoint is on port
+    IVR_METRICS_PORT + N, the file gets a "-worker-N" suffix before its
+    extension, and every series carries a worker="N" label.
+    """
+    port = os.environ.get("IVR_METRICS_PORT")
+    path = os.environ.get("IVR_METRICS_FILE")
+    if not port and not path:
+        return NullMetrics()
+    worker_id = os.environ.get("IVR_WORKER_ID")
+    if worker_id is None:
+        metrics = Metrics()
+    else:
+        metrics = Metrics(labels={"worker": worker_id})
+        if port:
+            port = int(port) + int(worker_id)
+        if path:
+            root, ext = os.path.splitext(path)
+            path = f"{root}-worker-{worker_id}{ext}"
+    if port:
+        start_http_server(metrics, int(port))
+    if path:
+        start_periodic_dump(metrics, path, float(os.environ.get("IVR_METRICS_INTERVAL", "60")))
+    return metrics
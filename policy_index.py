@@ -0,0 +1,288 @@
+"""Local policy-number index for caller verification.
+
+    python policy_index.py build POLICIES.txt policies.idx [--bits-per-key 10]
+    python policy_index.py check policies.idx POLICY_NUMBER
+
+`build` reads one policy number per line from a policy-book export and
+writes a single file:
+
+    header | bloom filter bits | sorted fixed-width keys
+
+Keys are normalized (upper case, letters and digits only) and padded to
+KEY_WIDTH bytes, so membership is a binary search over a memory-mapped
+array with no parsing at load time. Every worker process maps the same
+file and shares its pages. The bloom filter in front rejects almost
+every unknown number after a handful of bit probes, without touching
+the key array. The file is written next to its destination and renamed
+into place, so a PolicyVerifier polling it never sees half a snapshot.
+"""
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from metrics import NullMetrics
+
+
+MAGIC = b"IVRPOL1\0"
+KEY_WIDTH = 16
+_HEADER = struct.Struct("<8sQIIQ")  # magic, key count, key width, hash count, bloom bits
+_MASK = (1 << 64) - 1
+_SALT = 0x9E3779B97F4A7C15
+_NON_ALNUM = re.compile(r"[^A-Z0-9]")
+
+
+def normalize_policy(text):
+    """Padded key bytes for a policy number, or None if it cannot be one"""
+    key = _NON_ALNUM.sub("", text.upper())
+    if not key or len(key) > KEY_WIDTH:
+        return None
+    return key.encode("ascii").ljust(KEY_WIDTH, b"\0")
+
+
+# splitmix64 finalizer, once over Python ints and once over uint64 arrays (which wrap on overflow)
+
+def _mix(x):
+    x ^= x >> 30
+    x = (x * 0xBF58476D1CE4E5B9) & _MASK
+    x ^= x >> 27
+    x = (x * 0x94D049BB133111EB) & _MASK
+    return x ^ (x >> 31)
+
+
+def _mix_array(x):
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _hashes(key):
+    h1 = _mix(int.from_bytes(key[:8], "little") ^ _mix(int.from_bytes(key[8:], "little")))
+    return h1, _mix(h1 ^ _SALT) | 1
+
+
+def build_index(policy_numbers, path, bits_per_key=10):
+    """Write the index file for an iterable of policy-number strings; returns the key count"""
+    keys = [key for key in map(normalize_policy, policy_numbers) if key is not None]
+    keys = np.unique(np.array(keys, dtype=f"S{KEY_WIDTH}"))
+    count = len(keys)
+
+    num_hashes = max(1, round(bits_per_key * 0.693))
+    bloom_bits = max(64, -(-count * bits_per_key // 64) * 64)
+    bloom = np.zeros(bloom_bits // 8, dtype=np.uint8)
+    if count:
+        words = np.ascontiguousarray(keys).view("<u8").reshape(count, 2)
+        h1 = _mix_array(words[:, 0] ^ _mix_array(words[:, 1]))
+        h2 = _mix_array(h1 ^ np.uint64(_SALT)) | np.uint64(1)
+        for i in range(num_hashes):
+            positions = (h1 + np.uint64(i) * h2) % np.uint64(bloom_bits)
+            np.bitwise_or.at(bloom, (positions >> np.uint64(3)).astype(np.intp),
+                             (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, count, KEY_WIDTH, num_hashes, bloom_bits))
+        f.write(bloom.tobytes())
+        f.write(keys.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return count
+
+
+class PolicyIndex:
+    """Read side of an index file: bloom probe, then binary search over the mmap'd keys"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, key_width, self.num_hashes, self.bloom_bits = _HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or key_width != KEY_WIDTH:
+            raise ValueError(f"{path} is not a policy index")
+        bloom_start = _HEADER.size
+        keys_start = bloom_start + self.bloom_bits // 8
+        self.bloom = memoryview(self.buffer)[bloom_start:keys_start]
+        self.keys = np.frombuffer(self.buffer, dtype=f"S{KEY_WIDTH}", count=self.count, offset=keys_start)
+
+    def __len__(self):
+        return self.count
+
+    def might_contain(self, key):
+        """Bloom check on normalized key bytes: False means definitely absent"""
+        h1, h2 = _hashes(key)
+        bloom, bits = self.bloom, self.bloom_bits
+        for i in range(self.num_hashes):
+            position = ((h1 + i * h2) & _MASK) % bits
+            if not bloom[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def lookup(self, policy_number):
+        """"absent" (bloom reject), "missing" (bloom false positive) or "present" """
+        key = normalize_policy(policy_number)
+        if key is None or not self.might_contain(key):
+            return "absent"
+        i = int(np.searchsorted(self.keys, key))
+        return "present" if i < self.count and self.keys[i] == key.rstrip(b"\0") else "missing"
+
+    def __contains__(self, policy_number):
+        return self.lookup(policy_number) == "present"
+
+
+class RateLimiter:
+    """At most `max_attempts` recorded per key in any `window` seconds (sliding log per key)"""
+
+    def __init__(self, max_attempts=5, window=300.0, clock=time.monotonic):
+        self.max_attempts = max_attempts
+        self.window = window
+        self.clock = clock
+        self.attempts = {}
+        self.lock = threading.Lock()
+
+    def allow(self, key):
+        """False once `key` has used up its attempts for the current window"""
+        now = self.clock()
+        with self.lock:
+            log = self.attempts.get(key)
+            if log is None:
+                return True
+            while log and log[0] <= now - self.window:
+                log.popleft()
+            return len(log) < self.max_attempts
+
+    def record(self, key):
+        now = self.clock()
+        with self.lock:
+            log = self.attempts.get(key)
+            if log is None:
+                log = self.attempts[key] = deque()
+            log.append(now)
+            if len(self.attempts) > 100_000:
+                # Drop keys whose attempts have all aged out
+                self.attempts = {k: v for k, v in self.attempts.items() if v and v[-1] > now - self.window}
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class PolicyVerifier:
+    """DialogEngine verification backend over a PolicyIndex snapshot.
+
+    Failed attempts are rate limited per `caller`. That is a stable
+    identifier of where calls come from, such as the ANI a telephony
+    gateway reports or a browser's address. A guesser who hangs up and
+    calls again keeps the same budget. Nothing is limited per policy
+    number, so nobody can lock a real policyholder out by trying their
+    number. Attempts with no caller all share one bucket of
+    `shared_attempts`, so leaving the caller out never lifts the limit.
+    `start` polls the index file and swaps in a rebuilt
+    snapshot; lookups in flight finish against the old mapping, which is
+    released once nothing references it.
+    """
+
+    def __init__(self, path, refresh_interval=60.0, max_attempts=5, window=300.0,
+                 shared_attempts=50, metrics=None, clock=time.monotonic):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.metrics = metrics or NullMetrics()
+        self.limiter = RateLimiter(max_attempts, window, clock)
+        self.shared_limiter = RateLimiter(shared_attempts, window, clock)
+        self.signature = _signature(path)
+        self.index = PolicyIndex(path)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def verify(self, policy_number, caller=None):
+        """"present", "absent", "missing" (see PolicyIndex.lookup) or "rate_limited" """
+        limiter = self.limiter if caller is not None else self.shared_limiter
+        if not limiter.allow(caller):
+            result = "rate_limited"
+        else:
+            result = self.index.lookup(policy_number)
+            if result != "present":
+                limiter.record(caller)
+        self.metrics.inc("verify_total", result=result)
+        return result
+
+    def refresh(self):
+        """Reopen the index if the file changed; returns True if it did"""
+        signature = _signature(self.path)
+        if signature is None or signature == self.signature:
+            return False
+        self.index = PolicyIndex(self.path)
+        self.signature = signature
+        print(f"[VERIFY] Loaded {len(self.index)} policy numbers from {self.path}")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except (OSError, ValueError) as e:
+                print(f"[VERIFY] Refresh failed, keeping {len(self.index)} policy numbers: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="policy-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def verifier_from_env(metrics=None):
+    """PolicyVerifier for IVR_POLICY_INDEX (refreshed every IVR_POLICY_REFRESH_INTERVAL s), or None.
+
+    IVR_POLICY_SHARED_ATTEMPTS sizes the bucket shared by calls with no caller line.
+    """
+    path = os.environ.get("IVR_POLICY_INDEX")
+    if not path:
+        return None
+    interval = float(os.environ.get("IVR_POLICY_REFRESH_INTERVAL", "60"))
+    shared_attempts = int(os.environ.get("IVR_POLICY_SHARED_ATTEMPTS", "50"))
+    verifier = PolicyVerifier(path, refresh_interval=interval, shared_attempts=shared_attempts,
+                              metrics=metrics)
+    print(f"[VERIFY] Loaded {len(verifier.index)} policy numbers from {path}")
+    return verifier.start() if interval > 0 else verifier
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "build":
+        bits_per_key = 10
+    elif len(sys.argv) == 6 and sys.argv[1] == "build" and sys.argv[4] == "--bits-per-key":
+        bits_per_key = int(sys.argv[5])
+    elif len(sys.argv) == 4 and sys.argv[1] == "check":
+        index = PolicyIndex(sys.argv[2])
+        print(index.lookup(sys.argv[3]))
+        return
+    else:
+        print("Usage: python policy_index.py build POLICIES.txt INDEX [--bits-per-key N]\n"
+              "       python policy_index.py check INDEX POLICY_NUMBER")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    with open(sys.argv[2], "r") as f:
+        count = build_index((line for line in f if line.strip()), sys.argv[3], bits_per_key)
+    print(f"Indexed {count} policy numbers in {time.perf_counter() - start:.1f}s -> {sys.argv[3]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import importlib.util
+import os
+import re
+import threading
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+
+# A chunk is one header section of a KB article. The text lives in the
+# KB corpus buffer (kb_corpus.Corpus), so only byte offsets into it are
+# kept, with the section's heading level and the headings above it.
+Chunk = namedtuple("Chunk", ["doc_name", "heading", "level", "path", "start", "end"])
+
+_HEADING = re.compile(rb"^(#{1,6})[ \t]+(.*?)[ \t]*\r?$", re.MULTILINE)
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do for from have i if in is it me my of on "
+    "or our s t that the this to was we what will with you your".split()
+)
+
+
+def chunk_document(doc_name, data, base=0):
+    """Split a markdown article (UTF-8 bytes) into one chunk per header section.
+
+    `base` is the article's offset in the corpus buffer; chunk offsets are absolute.
+    """
+    chunks = []
+    matches = list(_HEADING.finditer(data))
+    if not matches or matches[0].start() > 0:
+        end = matches[0].start() if matches else len(data)
+        if bytes(data[:end]).strip():
+            chunks.append(Chunk(doc_name, "", 0, (), base, base + end))
+
+    # A heading with no body of its own (e.g. the article title) is folded
+    # into the section that follows it, and stays in the path of those below it.
+    start = None
+    parents = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(data)
+        level = len(match.group(1))
+        heading = match.group(2).decode("utf-8")
+        while parents and parents[-1][0] >= level:
+            parents.pop()
+        if start is None:
+            start = match.start()
+        if bytes(data[match.end():end]).strip():
+            path = tuple(title for _, title in parents)
+            chunks.append(Chunk(doc_name, heading, level, path, base + start, base + end))
+            start = None
+        parents.append((level, heading))
+    return chunks
+
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class HashingEmbedder:
+    """Offline fallback: signed feature hashing over word unigrams and bigrams,
+    plus character n-grams of each word when char_ngrams is set"""
+
+    def __init__(self, dim=512, char_ngrams=0):
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+        self.name = f"hashing-{dim}" + (f"-c{char_ngrams}" if char_ngrams else "")
+
+    def encode(self, texts):
+        n = self.char_ngrams
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            if n:
+                for token in tokens:
+                    padded = f"<{token}>"
+                    features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+            for feature in features:
+                h = zlib.crc32(feature.encode("utf-8"))
+                matrix[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        # Sublinear term frequency, then unit length so dot product = cosine
+        np.copysign(np.log1p(np.abs(matrix)), matrix, out=matrix)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        return matrix
+
+
+# Output sizes of common models, so an embedder can describe itself (and
+# match a warm cache) without importing torch
+KNOWN_DIMS = {
+    "all-MiniLM-L6-v2": 384,
+    "all-MiniLM-L12-v2": 384,
+    "paraphrase-MiniLM-L6-v2": 384,
+    "all-mpnet-base-v2": 768,
+    "multi-qa-MiniLM-L6-cos-v1": 384,
+}
+
+
+class EmbedderUnavailable(RuntimeError):
+    """The embedding model could not be loaded"""
+
+
+class SentenceTransformerEmbedder:
+    """Dense embeddings from a local sentence-transformers model.
+
+    The model (and torch with it) is loaded on the first encode, or when
+    `dim` is read for a model missing from KNOWN_DIMS. A worker whose KB
+    comes from a warm cache and whose turns all map straight to an
+    article never pays for it. The load is locked, so concurrent first
+    callers (retrieval runs on executor threads) share one model.
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL):
+        self.model_name = model_name
+        self.name = f"st-{model_name}"
+        self._model = None
+        self._dim = KNOWN_DIMS.get(model_name)
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    try:
+                        from sentence_transformers import SentenceTransformer
+
+                        model = SentenceTransformer(self.model_name)
+                    except Exception as e:
+                        raise EmbedderUnavailable(str(e)) from e
+                    self._dim = model.get_sentence_embedding_dimension()
+                    self._model = model
+        return self._model
+
+    @property
+    def dim(self):
+        if self._dim is None:
+            self.model
+        return self._dim
+
+    def encode(self, texts):
+        vectors = self.model.encode(
+            list(texts),
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        return np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(texts), self.dim)
+
+
+def load_embedder(model_name=None):
+    """Pick the configured embedding model, falling back to hashing offline.
+
+    Set IVR_EMBEDDING_MODEL=hashing to skip sentence-transformers entirely.
+    Only the package's presence is checked here; the model itself loads
+    lazily (see SentenceTransformerEmbedder).
+    """
+    model_name = model_name or os.environ.get("IVR_EMBEDDING_MODEL", DEFAULT_MODEL)
+    if model_name != "hashing":
+        if importlib.util.find_spec("sentence_transformers") is not None:
+            return SentenceTransformerEmbedder(model_name)
+        print("[KB] Embedding model unavailable (sentence-transformers not installed); "
+              "using hashing embedder")
+    return HashingEmbedder()
+
+
+class VectorIndex:
+    """All chunk embeddings in one contiguous float32 matrix.
+
+    Chunks of the same article are stored next to each other, so scoring
+    every chunk is one matrix-vector product and collapsing to per-article
+    scores is one reduceat.
+    """
+
+    def __init__(self, embedder):
+        self.embedder = embedder
+        self.docs = {}
+        self.chunks = []
+        self.doc_names = []
+        self.doc_offsets = np.zeros(0, dtype=np.intp)
+        self.doc_rows = {}
+        self.matrix = np.zeros((0, embedder.dim), dtype=np.float32)
+
+    def build(self, corpus):
+        """Embed every chunk of a kb_corpus.Corpus"""
+        texts = [corpus.text(c.start, c.end) for c in corpus.chunks]
+        matrix = self.embedder.encode(texts) if texts else None
+        self.set_matrix(corpus, corpus.chunks, matrix)
+
+    def set_matrix(self, docs, chunks, matrix):
+        """Install precomputed embeddings (one row per chunk, grouped by doc)"""
+        self.docs = docs
+        self.chunks = chunks
+        if matrix is None:
+            matrix = np.zeros((0, self.embedder.dim), dtype=np.float32)
+        if matrix.dtype != np.float32 or not matrix.flags["C_CONTIGUOUS"]:
+            matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.matrix = matrix
+
+        self.doc_names = []
+        offsets = []
+        for i, chunk in enumerate(chunks):
+            if not self.doc_names or self.doc_names[-1] != chunk.doc_name:
+                self.doc_names.append(chunk.doc_name)
+                offsets.append(i)
+        self.doc_offsets = np.asarray(offsets, dtype=np.intp)
+        self.doc_rows = {name: (offsets[i], offsets[i + 1] if i + 1 < len(offsets) else len(chunks))
+                         for i, name in enumerate(self.doc_names)}
+
+    def chunk_text(self, chunk):
+        return self.docs.text(chunk.start, chunk.end)
+
+    def _scores(self, query):
+        query_vec = self.embedder.encode([query])[0]
+        return self.matrix @ query_vec
+
+    @staticmethod
+    def _top_k(scores, k):
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.zeros(0, dtype=np.intp)
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    def search(self, query, k=3):
+        """Return the k best chunks as (chunk, score) pairs"""
+        if not self.chunks:
+            return []
+        scores = self._scores(query)
+        return [(self.chunks[i], float(scores[i])) for i in self._top_k(scores, k)]
+
+    def best_chunk(self, query, doc_name):
+        """The (chunk, score) of one article that best matches the query, or None"""
+        rows = self.doc_rows.get(doc_name)
+        if rows is None:
+            return None
+        query_vec = self.embedder.encode([query])[0]
+        scores = self.matrix[rows[0]:rows[1]] @ query_vec
+        best = int(scores.argmax())
+        return self.chunks[rows[0] + best], float(scores[best])
+
+    def search_documents(self, query, k=3):
+        """Return the k best articles as (doc_name, score) pairs, scored by their best chunk"""
+        if not self.chunks:
+            return []
+        doc_scores = np.maximum.reduceat(self._scores(query), self.doc_offsets)
+        return [(self.doc_names[i], float(doc_scores[i])) for i in self._top_k(doc_scores, k)]
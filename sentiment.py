@@ -0,0 +1,114 @@
+import re
+from array import array
+
+import numpy as np
+
+
+FEATURES = ("urgency", "frustration", "escalation", "distress", "positive")
+URGENCY, FRUSTRATION, ESCALATION, DISTRESS, POSITIVE = range(len(FEATURES))
+
+# term -> (feature, weight). Two-word entries are matched on bigrams and ignore negation.
+LEXICON = {
+    "injured": (URGENCY, 2.0), "injury": (URGENCY, 2.0), "hurt": (URGENCY, 2.0),
+    "bleeding": (URGENCY, 2.0), "ambulance": (URGENCY, 2.0), "fire": (URGENCY, 2.0),
+    "smoke": (URGENCY, 1.5), "smoking": (URGENCY, 1.5), "emergency": (URGENCY, 1.5),
+    "danger": (URGENCY, 1.5), "dangerous": (URGENCY, 1.5), "unsafe": (URGENCY, 1.5),
+    "stranded": (URGENCY, 1.0), "traffic": (URGENCY, 0.5), "dark": (URGENCY, 0.5),
+    "baby": (URGENCY, 0.5), "kids": (URGENCY, 0.5), "children": (URGENCY, 0.5),
+    "not safe": (URGENCY, 1.5), "in traffic": (URGENCY, 1.0), "middle of": (URGENCY, 0.5),
+
+    "ridiculous": (FRUSTRATION, 1.0), "frustrated": (FRUSTRATION, 1.0), "frustrating": (FRUSTRATION, 1.0),
+    "angry": (FRUSTRATION, 1.0), "annoyed": (FRUSTRATION, 0.8), "terrible": (FRUSTRATION, 0.8),
+    "worst": (FRUSTRATION, 0.8), "useless": (FRUSTRATION, 1.0), "unacceptable": (FRUSTRATION, 1.0),
+    "waste": (FRUSTRATION, 0.8), "again": (FRUSTRATION, 0.3), "already": (FRUSTRATION, 0.3),
+    "already told": (FRUSTRATION, 1.0), "already said": (FRUSTRATION, 1.0), "this again": (FRUSTRATION, 0.8),
+
+    "agent": (ESCALATION, 1.0), "representative": (ESCALATION, 1.0), "human": (ESCALATION, 1.0),
+    "supervisor": (ESCALATION, 1.5), "manager": (ESCALATION, 1.0), "operator": (ESCALATION, 1.0),
+    "real person": (ESCALATION, 1.5), "someone else": (ESCALATION, 0.5), "speak to": (ESCALATION, 0.5),
+    "talk to": (ESCALATION, 0.5),
+
+    "scared": (DISTRESS, 1.0), "afraid": (DISTRESS, 1.0), "worried": (DISTRESS, 0.8),
+    "panicking": (DISTRESS, 1.0), "panic": (DISTRESS, 1.0), "shaking": (DISTRESS, 0.8),
+    "upset": (DISTRESS, 0.8), "desperate": (DISTRESS, 1.0), "laid off": (DISTRESS, 0.8),
+    "can't afford": (DISTRESS, 0.8), "cannot afford": (DISTRESS, 0.8), "unemployed": (DISTRESS, 0.8),
+
+    "thanks": (POSITIVE, 0.5), "thank": (POSITIVE, 0.5), "great": (POSITIVE, 0.5),
+    "perfect": (POSITIVE, 0.5), "appreciate": (POSITIVE, 0.5),
+}
+
+NEGATIONS = frozenset(("no", "not", "never", "nobody", "isn't", "wasn't", "aren't", "don't", "didn't"))
+
+# Feature thresholds on the running score, checked in priority order
+LABELS = (
+    ("urgent", URGENCY, 1.5),
+    ("needs_agent", ESCALATION, 1.0),
+    ("frustrated", FRUSTRATION, 1.2),
+    ("distressed", DISTRESS, 1.0),
+)
+RANK = {"neutral": 0, "distressed": 1, "frustrated": 2, "needs_agent": 3, "urgent": 4}
+
+_WORD = re.compile(r"[a-z']+")
+
+
+class SentimentScorer:
+    """Per-turn lexicon scorer with a running per-session state.
+
+    Each caller utterance is turned into a small feature vector (one
+    np.bincount over the matched lexicon entries). The session keeps one
+    decayed running total per feature in `session.mood`, so a turn costs
+    one pass over its own words and never rescans the history. Labels
+    only ever escalate the session's sentiment: a call that turned urgent
+    stays urgent.
+    """
+
+    def __init__(self, lexicon=LEXICON, decay=0.7, labels=LABELS):
+        self.decay = decay
+        self.labels = labels
+        self.unigrams = {term: entry for term, entry in lexicon.items() if " " not in term}
+        self.bigrams = {term: entry for term, entry in lexicon.items() if " " in term}
+
+    def features(self, text):
+        """Feature vector for one utterance"""
+        words = _WORD.findall(text.lower())
+        indices = []
+        weights = []
+        negated_until = -1
+        for i, word in enumerate(words):
+            if word in NEGATIONS or word.endswith("n't"):
+                negated_until = i + 3
+                continue
+            entry = self.unigrams.get(word)
+            if entry is not None and i > negated_until:
+                indices.append(entry[0])
+                weights.append(entry[1])
+            if i:
+                entry = self.bigrams.get(words[i - 1] + " " + word)
+                if entry is not None:
+                    indices.append(entry[0])
+                    weights.append(entry[1])
+        if not indices:
+            return None
+        return np.bincount(indices, weights, minlength=len(FEATURES))
+
+    def update(self, session, text):
+        """Fold one caller utterance into session.mood and return the label it reaches, if any"""
+        if len(session.mood) != len(FEATURES):
+            session.mood = array('d', bytes(8 * len(FEATURES)))
+        # Zero-copy view of the session's array('d'), updated in place
+        mood = np.frombuffer(session.mood, dtype=np.float64)
+        mood *= self.decay
+        features = self.features(text)
+        if features is not None:
+            mood += features
+        for label, feature, threshold in self.labels:
+            if mood[feature] >= threshold:
+                return label
+        return None
+
+    def apply(self, session, text):
+        """update, then raise session.sentiment if the label outranks it"""
+        label = self.update(session, text)
+        if label is not None and RANK[label] > RANK.get(session.sentiment, 0):
+            session.update("sentiment", label)
+        return label
@@ -0,0 +1,137 @@
+"""Multi-process serving for the Gradio app.
+
+    python serve.py --workers 8 --port 7860
+
+The parent process builds the embedding cache once, then starts one
+app.py worker per core on ports PORT+1 .. PORT+N. Each worker mmaps the
+same embeddings.npy, so the matrix sits once in the page cache no matter
+how many workers read it. Sessions are kept in IVR_SESSION_STORE (a
+shared SQLite file by default), so any worker can continue any call.
+
+The parent also owns KB hot reload. It watches kb/, re-embeds edited
+articles and rewrites the cache. Workers only read the cache, and they
+reload when its manifest changes. An edit is therefore embedded once,
+not N times by workers racing to write the same files.
+
+Gradio's event protocol spans several HTTP requests per turn, so a
+client must stay on one worker. The built-in router on PORT pins each
+client address to a worker. Clients behind one gateway, proxy or NAT
+share one address, so all their calls land on a single worker. In that
+setup, use --no-router and an upstream that hashes a per-client value
+instead. With nginx, for example, that is `hash $http_x_forwarded_for
+consistent;` (or a session cookie) over the worker ports.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import zlib
+
+
+def warm_cache(kb_dir="kb"):
+    """Embed the KB once in the parent so workers start from a ready cache.
+
+    Returns the parent's KBWatcher, which keeps the cache current after
+    edits, or None when IVR_KB_RELOAD_INTERVAL is 0.
+    """
+    from kb_reload import KBWatcher
+    from knowledge_base import KnowledgeBase
+
+    kb = KnowledgeBase(kb_dir, verbose=True)
+    interval = float(os.environ.get("IVR_KB_RELOAD_INTERVAL", "2"))
+    return KBWatcher(kb, interval=interval).start() if interval > 0 else None
+
+
+def run_worker(worker_id, host, port):
+    # Also gives each worker its own metrics port or file (metrics.metrics_from_env)
+    os.environ["IVR_WORKER_ID"] = str(worker_id)
+    # Reload from the cache the parent maintains instead of re-embedding kb/ edits here
+    os.environ["IVR_KB_FOLLOW_CACHE"] = "1"
+    if os.environ.get("IVR_EVENT_LOG"):
+        # Segments are single-writer: each worker appends to its own subdirectory
+        os.environ["IVR_EVENT_LOG"] = os.path.join(os.environ["IVR_EVENT_LOG"], f"worker-{worker_id}")
+    import app
+
+    print(f"[SERVE] Worker {worker_id} (pid {os.getpid()}) on port {port}")
+    app.demo.launch(server_name=host, server_port=port)
+
+
+async def _pipe(reader, writer):
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def run_router(host, port, backends):
+    """Forward each TCP connection to the worker its client address hashes to"""
+
+    async def handle(client_reader, client_writer):
+        client_host = client_writer.get_extra_info("peername")[0]
+        backend_host, backend_port = backends[zlib.crc32(client_host.encode()) % len(backends)]
+        try:
+            backend_reader, backend_writer = await asyncio.open_connection(backend_host, backend_port)
+        except OSError:
+            client_writer.close()
+            return
+        await asyncio.gather(
+            _pipe(client_reader, backend_writer),
+            _pipe(backend_reader, client_writer),
+        )
+
+    server = await asyncio.start_server(handle, host, port)
+    print(f"[SERVE] Routing http://{host}:{port} to {len(backends)} workers")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the IVR app from several worker processes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7860)
+    parser.add_argument("--no-router", action="store_true",
+                        help="only start the workers (PORT+1 .. PORT+N) for an external load balancer")
+    args = parser.parse_args()
+
+    # Inherited by the workers: shared session storage, and one BLAS thread per
+    # process so N workers do not oversubscribe the cores
+    os.environ.setdefault("IVR_SESSION_STORE", "sqlite:///sessions.db")
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, "1")
+
+    kb_watcher = warm_cache()
+
+    context = multiprocessing.get_context("spawn")
+    ports = [args.port + 1 + i for i in range(args.workers)]
+    workers = [
+        context.Process(target=run_worker, args=(i, args.host, port), name=f"ivr-worker-{i}")
+        for i, port in enumerate(ports)
+    ]
+    for worker in workers:
+        worker.start()
+
+    try:
+        if args.no_router:
+            for worker in workers:
+                worker.join()
+        else:
+            asyncio.run(run_router(args.host, args.port, [(args.host, port) for port in ports]))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+
+
+if __name__ == "__main__":
+    main()
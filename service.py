@@ -0,0 +1,174 @@
+"""The IVR turn service shared by the Gradio app, the JSON API and the eval harness.
+
+Importing this module loads the knowledge base, dialog engine, metrics,
+event log and session store configured by the environment. It does not
+import Gradio, so batch jobs and tests can drive turns without it.
+"""
+import asyncio
+import atexit
+import os
+
+from answer_cache import AnswerCache
+from dialog import DialogEngine
+from event_log import EventLog
+from intent_classifier import IntentClassifier
+from kb_reload import KBWatcher
+from knowledge_base import KnowledgeBase
+from metrics import metrics_from_env
+from policy_index import verifier_from_env
+from session import CallSession
+from session_store import encode_state, open_store
+
+
+# Global variables
+# Set IVR_METRICS_PORT to serve Prometheus text at /metrics, or IVR_METRICS_FILE to dump it periodically
+metrics = metrics_from_env()
+# serve.py workers set IVR_KB_FOLLOW_CACHE: the parent re-embeds edited articles and
+# owns the cache files, and workers reload once it has rewritten them
+_follow_cache = bool(os.environ.get("IVR_KB_FOLLOW_CACHE"))
+# Near-duplicate issue descriptions reuse one search result until the KB changes
+kb = KnowledgeBase(answer_cache=AnswerCache(metrics=metrics), read_only_cache=_follow_cache)
+
+# Articles edited under kb/ are picked up without a restart; IVR_KB_RELOAD_INTERVAL=0 turns this off
+_reload_interval = float(os.environ.get("IVR_KB_RELOAD_INTERVAL", "2"))
+kb_watcher = (KBWatcher(kb, interval=_reload_interval, follow_cache=_follow_cache).start()
+              if _reload_interval > 0 else None)
+
+# IVR_EVENT_LOG=<dir> keeps an append-only audit log of every call (see event_log.py)
+event_log = EventLog(os.environ["IVR_EVENT_LOG"]) if os.environ.get("IVR_EVENT_LOG") else None
+# IVR_POLICY_INDEX=<file> verifies callers against a policy book built by policy_index.py
+engine = DialogEngine(kb, CallSession, classifier=IntentClassifier(), metrics=metrics,
+                      event_log=event_log, verifier=verifier_from_env(metrics))
+
+# With IVR_SESSION_STORE set (memory, sqlite:///path or redis://...), gr.State
+# only carries the session ID and any worker can serve the next turn.
+session_store = open_store(os.environ["IVR_SESSION_STORE"]).start() if os.environ.get("IVR_SESSION_STORE") else None
+
+# Commit the last group-commit buffer and the dirty sessions on a normal exit
+if event_log is not None:
+    atexit.register(event_log.close)
+if session_store is not None:
+    atexit.register(session_store.close)
+
+
+def new_session_state(caller_line=None):
+    return engine.new_state(caller_line=caller_line)
+
+
+def process_message(message, history, session_state, **prefetched):
+    """Process user message and return bot response
+    
+    `prefetched` lets process_message_async hand in `verified` or
+    `doc_info` results it already awaited; by default they are computed
+    inline by the dialog engine.
+    """
+    if session_state is None:
+        session_state = new_session_state()
+    
+    bot_response = engine.advance(session_state, message, **prefetched)
+    return bot_response, session_state
+
+
+class TurnHooks:
+    """Async I/O hooks awaited by process_message_async.
+    
+    The defaults reproduce the in-process behaviour, persisting to the
+    session store when one is configured; subclass to plug in a policy
+    lookup service or a remote retriever. The in-process calls block, so
+    the defaults run them in the default executor: a timeout then frees
+    the turn and the event loop even though the thread runs to completion.
+    """
+    
+    def __init__(self, store=None):
+        self.store = store
+    
+    async def verify(self, policy_number, caller=None):
+        return await asyncio.to_thread(engine.verify, policy_number, caller)
+    
+    async def retrieve(self, intent, issue_description=""):
+        return await asyncio.to_thread(kb.retrieve, intent, issue_description)
+    
+    async def persist(self, session_state):
+        if self.store is not None:
+            # Serialize on the loop, before the next turn can change the session
+            data = encode_state(session_state)
+            await asyncio.to_thread(self.store.put, session_state, data)
+
+
+# Per-hook timeouts in seconds
+STEP_TIMEOUTS = {"verify": 0.5, "retrieve": 0.02, "persist": 2.0}
+
+default_hooks = TurnHooks(session_store)
+
+# Keeps in-flight persistence tasks referenced until they finish
+_background_tasks = set()
+
+
+async def _persist(hooks, session_state, timeout):
+    try:
+        with metrics.time("hook_seconds", hook="persist"):
+            await asyncio.wait_for(hooks.persist(session_state), timeout)
+    except asyncio.TimeoutError:
+        metrics.inc("hook_timeouts_total", hook="persist")
+        session_state["session"].add_message("system", "Session persistence timed out")
+    except Exception as e:
+        metrics.inc("hook_errors_total", hook="persist")
+        session_state["session"].add_message("system", f"Session persistence failed: {e}")
+
+
+async def process_message_async(message, history, session_state, hooks=None, timeouts=None,
+                                caller_line=None, persist=True):
+    """Async version of process_message.
+    
+    Verification and retrieval are awaited with per-step timeouts before
+    the step logic runs; a timeout degrades to "unverified" or "no article"
+    instead of stalling the turn. Persistence runs in the background so the
+    reply is never held up by it; with `persist=False` saving the session
+    is left to the caller. `caller_line` identifies where a new call comes
+    from, for the verifier's per-caller rate limit.
+    """
+    hooks = hooks or default_hooks
+    timeouts = {**STEP_TIMEOUTS, **(timeouts or {})}
+    
+    if session_state is None:
+        session_state = new_session_state(caller_line)
+    
+    session = session_state["session"]
+    step = engine.steps[session_state["step"]]
+    prefetched = {}
+    
+    if step.hook == "verify":
+        try:
+            with metrics.time("hook_seconds", hook="verify"):
+                prefetched["verified"] = await asyncio.wait_for(
+                    hooks.verify(step.parse(message), session.caller_line), timeouts["verify"])
+        except asyncio.TimeoutError:
+            metrics.inc("hook_timeouts_total", hook="verify")
+            prefetched["verified"] = "unavailable"
+            session.add_message("system", "Verification timed out")
+    elif step.hook == "retrieve":
+        if step.classify and message.strip() not in step.choices:
+            # Batched with other callers' turns, and handed to the engine so it is not classified twice
+            with metrics.time("hook_seconds", hook="classify"):
+                intent = await engine.classifier.classify_async(message)
+        else:
+            intent = step.parse(message)
+        prefetched["parsed"] = intent
+        if intent:
+            try:
+                with metrics.time("hook_seconds", hook="retrieve"):
+                    prefetched["doc_info"] = await asyncio.wait_for(
+                        hooks.retrieve(intent, session.issue_description or message), timeouts["retrieve"])
+            except asyncio.TimeoutError:
+                metrics.inc("hook_timeouts_total", hook="retrieve")
+                prefetched["doc_info"] = None
+                session.add_message("system", "Knowledge base retrieval timed out")
+    
+    bot_response, session_state = process_message(message, history, session_state, **prefetched)
+    
+    if persist:
+        task = asyncio.create_task(_persist(hooks, session_state, timeouts["persist"]))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    
+    return bot_response, session_state
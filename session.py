@@ -0,0 +1,210 @@
+import json
+import secrets
+import time
+from array import array
+from datetime import datetime
+
+from handoff import FIELDS as HANDOFF_FIELDS, HandoffRecord
+
+
+ROLES = ("user", "assistant", "system")
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+# Fields exposed through `state` and settable through `update`
+STATE_FIELDS = (
+    "session_id",
+    "caller_id",
+    "caller_line",
+    "verified",
+    "intent",
+    "issue_description",
+    "steps_tried",
+    "sentiment",
+    "conversation_history",
+    "retrieved_docs",
+    "incident_details",
+)
+
+
+def new_session_id():
+    """CALL-<timestamp>-<random suffix>; the suffix keeps IDs unique within a second"""
+    return f"CALL-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(4)}"
+
+
+class CallSession:
+    """State for one call.
+
+    Conversation history is kept as parallel arrays (role codes, content
+    references, epoch timestamps) rather than a list of dicts. Replies
+    that are a bare flow prompt reference the interned
+    CompiledStep.prompt, so they are shared across sessions. Everything
+    else is stored as is, since interned strings are never freed. The
+    dict form is built only when `state` or `conversation_history` is read.
+
+    `mood` holds the running per-feature scores of sentiment.SentimentScorer.
+    When `events` is set (an event_log.EventLog, see attach_log), every
+    change below is also appended to the call's audit log.
+
+    Write list and incident fields through update, set_detail, add_step
+    and add_retrieved_doc so the incremental `handoff` record stays current.
+
+    `clock` (epoch seconds for message timestamps) and `new_id` (session
+    IDs) are class attributes, so they cost nothing per session. A
+    subclass can replace them, and a DialogEngine uses it through its
+    session_factory. simulate.py does this for reproducible runs.
+    """
+
+    __slots__ = (
+        "session_id",
+        "caller_id",
+        "caller_line",
+        "verified",
+        "intent",
+        "issue_description",
+        "steps_tried",
+        "sentiment",
+        "retrieved_docs",
+        "incident_details",
+        "log_updates",
+        "handoff",
+        "mood",
+        "events",
+        "_roles",
+        "_contents",
+        "_timestamps",
+    )
+
+    clock = staticmethod(time.time)
+    new_id = staticmethod(new_session_id)
+
+    def __init__(self, log_updates=False):
+        self.session_id = self.new_id()
+        self.caller_id = None
+        # Where the call comes from (ANI or client address), set by the front end
+        self.caller_line = None
+        self.verified = False
+        self.intent = None
+        self.issue_description = ""
+        self.steps_tried = []
+        self.sentiment = "neutral"
+        self.retrieved_docs = []
+        self.incident_details = {}
+        self.log_updates = log_updates
+        self.mood = array('d')
+        self.events = None
+        self._roles = array('B')
+        self._contents = []
+        self._timestamps = array('d')
+        self.handoff = HandoffRecord.from_session(self)
+
+    def update(self, key, value):
+        """Update a state field (and log it if log_updates is set)"""
+        if key not in STATE_FIELDS or key == "conversation_history":
+            raise KeyError(f"Unknown session field: {key}")
+        setattr(self, key, value)
+        if key in HANDOFF_FIELDS:
+            self.handoff.set(key, value)
+        if self.events is not None:
+            self.events.record_update(self.session_id, key, value)
+        if self.log_updates:
+            print(f"[STATE UPDATE] {key}: {value}")
+
+    def attach_log(self, events):
+        """Start appending this session's changes to an EventLog"""
+        if self.events is None:
+            self.events = events
+            events.record_start(self.session_id)
+
+    def add_message(self, role, content, timestamp=None):
+        """Add to conversation history"""
+        timestamp = self.clock() if timestamp is None else timestamp
+        self._roles.append(ROLE_CODES[role])
+        self._contents.append(content)
+        self._timestamps.append(timestamp)
+        self.handoff.count_turn()
+        if self.events is not None:
+            self.events.record_message(self.session_id, role, content, timestamp)
+
+    def set_detail(self, key, value):
+        """Record one incident detail"""
+        self.handoff.set_detail(key, value)
+        if self.events is not None:
+            self.events.record_detail(self.session_id, key, value)
+
+    def add_step(self, step):
+        """Record a step the caller has already tried"""
+        self.steps_tried.append(step)
+        self.handoff.add_step(step)
+        if self.events is not None:
+            self.events.record_step(self.session_id, step)
+
+    def add_retrieved_doc(self, doc_name):
+        self.retrieved_docs.append(doc_name)
+        self.handoff.add_doc(doc_name)
+        if self.events is not None:
+            self.events.record_doc(self.session_id, doc_name)
+
+    @property
+    def last_user_message(self):
+        """The caller's most recent utterance, or "" before they have said anything"""
+        user = ROLE_CODES["user"]
+        for i in range(len(self._roles) - 1, -1, -1):
+            if self._roles[i] == user:
+                return self._contents[i]
+        return ""
+
+    @property
+    def turn_count(self):
+        return len(self._roles)
+
+    @property
+    def conversation_history(self):
+        """The history materialized as a list of {role, content, timestamp} dicts"""
+        return [
+            {
+                "role": ROLES[code],
+                "content": content,
+                "timestamp": datetime.fromtimestamp(ts).isoformat()
+            }
+            for code, content, ts in zip(self._roles, self._contents, self._timestamps)
+        ]
+
+    def to_record(self):
+        """JSON-serializable form used by session stores; history stays columnar"""
+        record = {field: getattr(self, field) for field in STATE_FIELDS if field != "conversation_history"}
+        record["history"] = {
+            "roles": self._roles.tolist(),
+            "contents": self._contents,
+            "timestamps": self._timestamps.tolist(),
+        }
+        record["mood"] = self.mood.tolist()
+        return record
+
+    @classmethod
+    def from_record(cls, record):
+        session = cls()
+        for field in STATE_FIELDS:
+            if field in record:
+                setattr(session, field, record[field])
+        history = record.get("history", {})
+        session._roles = array('B', history.get("roles", ()))
+        session._contents = list(history.get("contents", ()))
+        session._timestamps = array('d', history.get("timestamps", ()))
+        session.mood = array('d', record.get("mood", ()))
+        session.handoff = HandoffRecord.from_session(session)
+        return session
+
+    @property
+    def state(self):
+        """A snapshot of the session as a plain dict"""
+        return {field: getattr(self, field) for field in STATE_FIELDS}
+
+    def generate_handoff_summary(self):
+        """Generate the agent handoff summary"""
+        return self.handoff.render()
+
+    def display_state(self):
+        """Pretty print current state"""
+        print("\n--- Current Session State ---")
+        print(json.dumps(self.state, indent=2, default=str))
+        print("-----------------------------\n")
@@ -0,0 +1,277 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from session import CallSession
+
+
+DEFAULT_TTL = 30 * 60
+
+
+def encode_state(session_state):
+    """Serialize a dialog session_state ({"session", "step", ...}) to bytes"""
+    record = {key: value for key, value in session_state.items() if key != "session"}
+    record["session"] = session_state["session"].to_record()
+    return json.dumps(record, separators=(",", ":")).encode("utf-8")
+
+
+def decode_state(data, session_factory=CallSession):
+    record = json.loads(data)
+    record["session"] = session_factory.from_record(record["session"])
+    return record
+
+
+class MemoryBackend:
+    """In-process LRU backend with per-entry expiry"""
+
+    def __init__(self, capacity=100_000):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def load(self, key, now):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            data, expires_at = entry
+            if expires_at < now:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return data
+
+    def save_many(self, items):
+        with self.lock:
+            for key, data, expires_at in items:
+                self.entries[key] = (data, expires_at)
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def purge_expired(self, now):
+        with self.lock:
+            expired = [key for key, (_, expires_at) in self.entries.items() if expires_at < now]
+            for key in expired:
+                del self.entries[key]
+        return len(expired)
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend:
+    """SQLite backend in WAL mode, so readers in other workers never block the flusher"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, data BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS sessions_expiry ON sessions (expires_at)")
+
+    def load(self, key, now):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT data FROM sessions WHERE id = ? AND expires_at >= ?", (key, now)
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_many(self, items):
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(
+                    "INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+                    items,
+                )
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def delete(self, key):
+        with self.lock:
+            self.conn.execute("DELETE FROM sessions WHERE id = ?", (key,))
+
+    def purge_expired(self, now):
+        with self.lock:
+            return self.conn.execute("DELETE FROM sessions WHERE expires_at < ?", (now,)).rowcount
+
+    def scan(self, batch_size=1000):
+        """Yield every stored session blob (including expired rows not yet purged),
+        reading in batches on a separate connection"""
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute("SELECT data FROM sessions")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for (data,) in rows:
+                    yield data
+        finally:
+            conn.close()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class RedisBackend:
+    """Backend for a Redis server or any client with the same get/set/delete API
+    (e.g. a local stand-in such as fakeredis). Redis handles expiry itself."""
+
+    def __init__(self, client=None, url="redis://localhost:6379/0", prefix="ivr:session:"):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def load(self, key, now):
+        return self.client.get(self.prefix + key)
+
+    def save_many(self, items):
+        pipe = self.client.pipeline()
+        for key, data, expires_at in items:
+            pipe.set(self.prefix + key, data, ex=max(1, int(expires_at - time.time())))
+        pipe.execute()
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def purge_expired(self, now):
+        return 0
+
+    def close(self):
+        pass
+
+
+class SessionStore:
+    """Externalized storage for dialog session_state dicts.
+
+    `put` serializes the session and marks it dirty; dirty sessions are
+    written to the backend in batches by `flush`, either from the
+    background flusher started with `start()` or explicitly. `get` returns
+    a pending local copy first so a worker always reads its own writes.
+    Every write pushes the session's expiry out by `ttl` seconds.
+    """
+
+    def __init__(self, backend, ttl=DEFAULT_TTL, flush_interval=0.25, batch_size=500,
+                 session_factory=CallSession):
+        self.backend = backend
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.session_factory = session_factory
+        self.pending = {}
+        self.flushing = {}
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self, session_id):
+        with self.lock:
+            entry = self.pending.get(session_id) or self.flushing.get(session_id)
+        if entry is not None:
+            return entry[0]
+        data = self.backend.load(session_id, time.time())
+        return decode_state(data, self.session_factory) if data is not None else None
+
+    def put(self, session_state, data=None):
+        """Mark a session dirty; `data` is its encode_state bytes if already serialized"""
+        session_id = session_state["session"].session_id
+        # Encode now: the live session keeps changing while it waits for a flush
+        if data is None:
+            data = encode_state(session_state)
+        with self.lock:
+            self.pending[session_id] = (session_state, data)
+            backlog = len(self.pending)
+        if self._thread is None and backlog >= self.batch_size:
+            self.flush()
+        return session_id
+
+    def delete(self, session_id):
+        with self.lock:
+            self.pending.pop(session_id, None)
+        self.backend.delete(session_id)
+
+    def flush(self):
+        """Write all dirty sessions to the backend; returns how many were written"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.flushing = pending
+        if not pending:
+            return 0
+
+        expires_at = time.time() + self.ttl
+        items = [(session_id, data, expires_at) for session_id, (_, data) in pending.items()]
+        try:
+            for i in range(0, len(items), self.batch_size):
+                self.backend.save_many(items[i:i + self.batch_size])
+        except Exception:
+            # Put back anything not superseded meanwhile so the next flush retries it
+            with self.lock:
+                for session_id, entry in pending.items():
+                    self.pending.setdefault(session_id, entry)
+            raise
+        finally:
+            with self.lock:
+                self.flushing = {}
+        return len(items)
+
+    def purge_expired(self):
+        return self.backend.purge_expired(time.time())
+
+    def _run(self):
+        last_purge = time.time()
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+                if time.time() - last_purge > 60:
+                    self.purge_expired()
+                    last_purge = time.time()
+            except Exception as e:
+                print(f"[SESSION STORE] Flush failed: {e}")
+
+    def start(self):
+        """Start the background write-behind flusher"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="session-store-flusher", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        self.backend.close()
+
+
+def open_store(url, **kwargs):
+    """Build a store from a URL: "memory", "sqlite:///path/to.db" or "redis://host:port/db" """
+    if url == "memory":
+        backend = MemoryBackend()
+    elif url.startswith("sqlite:///"):
+        backend = SQLiteBackend(url[len("sqlite:///"):])
+    elif url.startswith("redis://"):
+        backend = RedisBackend(url=url)
+    else:
+        raise ValueError(f"Unsupported session store URL: {url}")
+    return SessionStore(backend, **kwargs)
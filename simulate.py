@@ -0,0 +1,355 @@
+"""Seeded synthetic calls through the dialog engine, for throughput and regression runs.
+
+    python simulate.py --calls 1000000 [--processes 8] [--seed 0] [--config sim.json]
+                       [--output run.json] [--baseline previous.json]
+
+Every call is drawn from the config (DEFAULT_CONFIG, with --config JSON
+merged over it). The config sets the intent mix, how often callers say
+what they need instead of pressing a digit, mistyped policy numbers,
+billing choices, answer phrasings with filler words, zero-outs,
+abandonment and the transfer rate. Call N always gets the same random
+stream, SimClock timestamps and SequentialIds session ID. The same seed
+and config therefore replay the same calls however the work is split
+across processes. `digest` sums a hash of every call's handoff record,
+so it changes only when the dialog behaviour changes, while throughput
+tracks speed. With --baseline both are compared against an earlier
+--output.
+
+Calls run in a plain loop with no I/O, event log or session store. The
+KB uses the hashing embedder, so a run needs neither torch nor a network.
+Its embeddings are cached in SIM_CACHE_DIR, apart from the cache the app
+and serve.py keep for the production embedder.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from dialog import END_STEP, INTENT_MAP, ZERO_OUT, DialogEngine
+from intent_classifier import IntentClassifier
+from kb_cache import default_cache_dir
+from knowledge_base import KnowledgeBase
+from metrics import LATENCY_BUCKETS, Histogram
+from retrieval import HashingEmbedder
+from session import CallSession
+
+
+DIGITS = {intent: digit for digit, intent in INTENT_MAP.items()}
+
+SIM_CACHE_DIR = os.path.join(default_cache_dir("kb"), "simulate")
+
+DEFAULT_CONFIG = {
+    "intents": {"file_claim": 0.40, "billing": 0.25, "roadside": 0.25, "policy_change": 0.10},
+    "spoken_intent": 0.3,
+    "invalid_policy": 0.05,
+    "billing_types": {"1": 0.40, "2": 0.35, "3": 0.25},
+    "variation": 0.3,
+    "abandon": 0.08,
+    "zero_out": 0.03,
+    "transfer": 0.6,
+    "max_turns": 30,
+    "spoken": {
+        "file_claim": ["I need to report an accident", "somebody hit my car",
+                       "my windshield got cracked by a rock", "I was in a fender bender"],
+        "billing": ["I need more time to pay my bill", "there's a charge I don't understand",
+                    "I want to make a payment", "can I set up a payment plan"],
+        "roadside": ["my car broke down", "I need a tow", "I've got a flat tire",
+                     "my car won't start, it's just clicking"],
+        "policy_change": ["I want to add a driver", "change my coverage", "update my address",
+                          "I bought a new car"],
+    },
+    "answers": {
+        "claim_description": ["I was rear-ended at a stoplight", "Someone backed into me in a parking lot",
+                              "Hail damaged my car", "A tree fell on my car last night",
+                              "I hit a deer on the highway this morning"],
+        "claim_when": ["This morning", "Yesterday at 5pm", "Last night", "About an hour ago", "On Monday"],
+        "claim_where": ["Highway 101, San Jose", "In the Target parking lot",
+                        "At the intersection of Main and 5th", "On Elm Street", "Near the mall"],
+        "claim_damage": ["Rear bumper crumpled", "Cracked windshield", "Dented driver's door",
+                         "Smashed headlights and a bent hood"],
+        "claim_photos": ["yes", "no", "I took some photos", "I don't have any pictures"],
+        "billing_reason": ["I was laid off", "Medical bills this month", "My paycheck is late",
+                           "I'm between jobs right now"],
+        "roadside_description": ["My car won't start, it's just clicking", "I have a flat tire",
+                                 "I locked my keys in the car", "I ran out of gas", "The engine overheated"],
+        "roadside_location": ["I-280 near exit 12", "In a parking garage downtown", "On Oak Avenue",
+                              "Highway 17 by the summit"],
+        "roadside_issue": ["Dead battery", "Flat tire", "Won't start", "Keys locked inside"],
+        "roadside_safety": ["yes", "no", "I'm pulled over on the shoulder", "Not safe, I'm in traffic"],
+        "general_description": ["Add my teenager to the policy", "Increase my deductible",
+                                "Add comprehensive coverage", "Remove my old truck"],
+    },
+    "fillers": ["um", "so", "well", "uh", "yeah"],
+}
+
+OUTCOMES = ("transferred", "self_service", "zeroed_out", "abandoned", "stuck")
+
+
+class SimClock:
+    """Deterministic stand-in for time.time: each reading advances by `tick` seconds"""
+
+    def __init__(self, start=1_700_000_000.0, tick=4.0):
+        self.now = start
+        self.tick = tick
+
+    def __call__(self):
+        self.now += self.tick
+        return self.now
+
+    def set(self, now):
+        self.now = now
+
+
+class SequentialIds:
+    """Deterministic session IDs: SIM-<run>-<n>, where n is set per call"""
+
+    def __init__(self, run="0"):
+        self.prefix = f"SIM-{run}-"
+        self.next = 0
+
+    def __call__(self):
+        session_id = f"{self.prefix}{self.next:09d}"
+        self.next += 1
+        return session_id
+
+
+def session_class(clock, ids):
+    """A CallSession subclass that reads time from `clock` and takes IDs from `ids`"""
+    return type("SimCallSession", (CallSession,), {
+        "__slots__": (),
+        "clock": staticmethod(clock),
+        "new_id": staticmethod(ids),
+    })
+
+
+def load_config(path=None):
+    config = dict(DEFAULT_CONFIG)
+    if path:
+        with open(path, "r") as f:
+            config.update(json.load(f))
+    return config
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+class Caller:
+    """One synthetic caller: every random choice for the call is made up front"""
+
+    def __init__(self, rng, config):
+        self.rng = rng
+        self.config = config
+        self.intent = _weighted(rng, config["intents"])
+        self.spoken = rng.random() < config["spoken_intent"]
+        if rng.random() < config["invalid_policy"]:
+            self.policy_number = str(rng.randrange(1000))
+        else:
+            self.policy_number = f"POL{rng.randrange(10 ** 6, 10 ** 7)}"
+        self.billing_type = _weighted(rng, config["billing_types"])
+        self.final_choice = "2" if rng.random() < config["transfer"] else "1"
+        self.abandon_at = rng.randrange(1, 8) if rng.random() < config["abandon"] else None
+        self.zero_out_at = rng.randrange(2, 6) if rng.random() < config["zero_out"] else None
+
+    def vary(self, message):
+        rng = self.rng
+        if rng.random() < self.config["variation"]:
+            message = f"{rng.choice(self.config['fillers'])} {message}"
+        if rng.random() < self.config["variation"]:
+            message = message.lower()
+        return message
+
+    def answer(self, step, attempt):
+        if step == "verification":
+            return self.policy_number
+        if step == "intent_selection":
+            # Callers who are not understood fall back to the menu digit
+            if self.spoken and attempt == 0:
+                return self.vary(self.rng.choice(self.config["spoken"][self.intent]))
+            return DIGITS[self.intent]
+        if step == "billing_type":
+            return self.billing_type
+        if step == "final_choice":
+            return self.final_choice
+        phrasings = self.config["answers"].get(step)
+        return self.vary(self.rng.choice(phrasings)) if phrasings else "Not sure"
+
+
+def run_call(engine, caller, max_turns, latency):
+    """Drive one call to the end; returns (outcome, caller turns, session)"""
+    session_state = engine.new_state()
+    turns = 0
+    attempt = 0
+    previous = None
+    outcome = None
+    while session_state["step"] != END_STEP:
+        if turns == caller.abandon_at:
+            outcome = "abandoned"
+            break
+        if turns >= max_turns:
+            outcome = "stuck"
+            break
+        step = session_state["step"]
+        attempt = attempt + 1 if step == previous else 0
+        previous = step
+        if turns == caller.zero_out_at:
+            message = ZERO_OUT
+            outcome = "zeroed_out"
+        else:
+            message = caller.answer(step, attempt)
+        start = time.perf_counter()
+        engine.advance(session_state, message)
+        latency.observe(time.perf_counter() - start)
+        turns += 1
+        if outcome == "zeroed_out":
+            break
+    if outcome is None:
+        outcome = "transferred" if caller.final_choice == "2" else "self_service"
+    return outcome, turns, session_state["session"]
+
+
+def build_engine(clock, ids):
+    kb = KnowledgeBase(embedder=HashingEmbedder(), cache_dir=SIM_CACHE_DIR)
+    return DialogEngine(kb, session_class(clock, ids), classifier=IntentClassifier())
+
+
+def run_shard(seed, config, first, last):
+    """Simulate calls first..last-1; returns a partial report"""
+    clock = SimClock()
+    ids = SequentialIds(seed)
+    engine = build_engine(clock, ids)
+    max_turns = config["max_turns"]
+    latency = Histogram(LATENCY_BUCKETS)
+    outcomes = dict.fromkeys(OUTCOMES, 0)
+    intents = dict.fromkeys(config["intents"], 0)
+    turns = 0
+    digest = 0
+
+    start = time.perf_counter()
+    for index in range(first, last):
+        # Per-call streams: a call does not depend on the ones before it or on the sharding
+        rng = random.Random(f"{seed}:{index}")
+        clock.set(1_700_000_000.0 + index * 600.0)
+        ids.next = index
+        caller = Caller(rng, config)
+        outcome, call_turns, session = run_call(engine, caller, max_turns, latency)
+        outcomes[outcome] += 1
+        intents[caller.intent] += 1
+        turns += call_turns
+        summary = session.generate_handoff_summary().encode("utf-8")
+        digest = (digest + int.from_bytes(hashlib.blake2b(summary, digest_size=8).digest(), "little")) & (2 ** 64 - 1)
+    elapsed = time.perf_counter() - start
+
+    return {"calls": last - first, "turns": turns, "cpu_seconds": elapsed, "outcomes": outcomes,
+            "intents": intents, "digest": digest, "latency_counts": latency.counts,
+            "latency_sum": latency.sum}
+
+
+def _run_shard(args):
+    return run_shard(*args)
+
+
+def _merge(parts):
+    report = {"calls": 0, "turns": 0, "cpu_seconds": 0.0, "outcomes": {}, "intents": {}, "digest": 0,
+              "latency_counts": [0] * (len(LATENCY_BUCKETS) + 1), "latency_sum": 0.0}
+    for part in parts:
+        for key in ("calls", "turns", "cpu_seconds", "latency_sum"):
+            report[key] += part[key]
+        for key in ("outcomes", "intents"):
+            for name, count in part[key].items():
+                report[key][name] = report[key].get(name, 0) + count
+        report["digest"] = (report["digest"] + part["digest"]) & (2 ** 64 - 1)
+        report["latency_counts"] = [a + b for a, b in zip(report["latency_counts"], part["latency_counts"])]
+    return report
+
+
+def _bucket_percentile(counts, pct):
+    """Upper bound of the latency bucket holding the given percentile"""
+    target = sum(counts) * pct / 100
+    seen = 0
+    for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), counts):
+        seen += count
+        if seen >= target:
+            return bound
+    return float("inf")
+
+
+def simulate(calls, seed=0, config=None, processes=1):
+    config = config or DEFAULT_CONFIG
+    processes = max(1, min(processes, calls))
+    bounds = [calls * i // processes for i in range(processes + 1)]
+    shards = [(seed, config, bounds[i], bounds[i + 1]) for i in range(processes)]
+
+    start = time.perf_counter()
+    if processes == 1:
+        parts = [run_shard(*shards[0])]
+    else:
+        with multiprocessing.get_context("spawn").Pool(processes) as pool:
+            parts = pool.map(_run_shard, shards)
+    report = _merge(parts)
+    report["wall_seconds"] = time.perf_counter() - start
+    report["seed"] = seed
+    report["processes"] = processes
+    report["digest"] = f"{report['digest']:016x}"
+    return report
+
+
+def print_report(report, baseline=None):
+    calls, turns = report["calls"], report["turns"]
+    wall = report["wall_seconds"]
+    counts = report["latency_counts"]
+    print(f"calls:        {calls:,} ({turns:,} caller turns), seed {report['seed']}, "
+          f"{report['processes']} process(es)")
+    print(f"throughput:   {calls / wall:,.0f} calls/s, {turns / wall:,.0f} turns/s "
+          f"({wall:.2f}s wall, {report['cpu_seconds']:.2f}s in calls)")
+    print(f"turn latency: mean {report['latency_sum'] / max(turns, 1) * 1e6:.1f} µs, "
+          f"p50 <= {_bucket_percentile(counts, 50) * 1e6:.0f} µs, "
+          f"p99 <= {_bucket_percentile(counts, 99) * 1e6:.0f} µs")
+    print("outcomes:     " + ", ".join(f"{name} {count / calls:.1%}"
+                                      for name, count in report["outcomes"].items() if count))
+    print("intents:      " + ", ".join(f"{name} {count / calls:.1%}" for name, count in report["intents"].items()))
+    print(f"digest:       {report['digest']}")
+
+    if baseline:
+        speedup = (calls / wall) / (baseline["calls"] / baseline["wall_seconds"])
+        print(f"\nvs baseline:  throughput x{speedup:.2f}")
+        if baseline["seed"] != report["seed"] or baseline["calls"] != calls:
+            print("              digest not comparable (different seed or call count)")
+        elif baseline["digest"] == report["digest"]:
+            print("              digest matches: same dialog behaviour")
+        else:
+            print(f"              digest differs ({baseline['digest']}): dialog behaviour changed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive seeded synthetic calls through the dialog engine")
+    parser.add_argument("--calls", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=1,
+                        help=f"worker processes (this machine has {os.cpu_count()} cores)")
+    parser.add_argument("--config", help="JSON file merged over DEFAULT_CONFIG")
+    parser.add_argument("--output", help="write the report as JSON, e.g. for a later --baseline")
+    parser.add_argument("--baseline", help="report JSON from an earlier run to compare against")
+    args = parser.parse_args()
+
+    # Build the embedding cache once so worker processes start from it
+    KnowledgeBase(embedder=HashingEmbedder(), cache_dir=SIM_CACHE_DIR)
+    report = simulate(args.calls, args.seed, load_config(args.config), args.processes)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
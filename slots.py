@@ -0,0 +1,113 @@
+import re
+
+
+# Every pattern is compiled once at import; extraction is a handful of regex scans per utterance
+
+WHEN = re.compile(
+    r"\b(today|yesterday|tonight|last night|this (?:morning|afternoon|evening)|just now"
+    r"|an? (?:minute|hour|day|week)s? ago|\d+ (?:minutes?|hours?|days?|weeks?) ago"
+    r"|(?:on |last )?(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday)"
+    r"|(?:at |around )?\d{1,2}(?::\d\d)? ?(?:am|pm|a\.m\.|p\.m\.))\b",
+    re.IGNORECASE,
+)
+
+_ROAD = r"(?:highway|hwy|interstate|route|freeway|i-|us-|sr-)\s*\d+"
+_DAYS = (r"(?:Monday|Tuesday|Wednesday|Thursday|Friday|Saturday|Sunday|January|February|March|April"
+         r"|May|June|July|August|September|October|November|December)\b")
+_PLACE = rf"(?!{_DAYS})[A-Z][a-z]+(?: [A-Z][a-z]+){{0,2}}"
+_PLACE_NOUNS = r"street|st|avenue|ave|road|rd|boulevard|blvd|drive|dr|parking lot|parking garage|mall|station"
+WHERE = re.compile(
+    rf"\b(?:(?i:on|at|near) (?:the )?)?(?i:{_ROAD})(?:,? (?:(?i:in|near) )?{_PLACE})?"
+    rf"|\b(?i:(?:at )?the intersection of) \w+(?: \w+)? and \w+"
+    rf"|\b(?i:on|at|near|in) (?:the |a )?{_PLACE}(?: (?i:{_PLACE_NOUNS})\b)?"
+    r"|\b(?i:(?:a |the )?(?:parking (?:lot|garage)|driveway|gas station|shoulder))\b"
+)
+
+_PARTS = (r"bumper|fender|door|windshield|window|hood|trunk|mirror|headlights?|taillights?"
+          r"|grille|quarter panel|tailgate|roof|wheel")
+_DAMAGE_WORDS = r"crumpled|dented|cracked|smashed|scratched|broken|shattered|damaged|bent|crushed|dinged"
+DAMAGE = re.compile(
+    rf"\b(?:(?:front|rear|back|driver'?s?|passenger'?s?|left|right|side) )*(?:{_PARTS})"
+    rf"(?: (?:is|was|got|are|were|all))? (?:{_DAMAGE_WORDS})\b"
+    rf"|\b(?:{_DAMAGE_WORDS}) (?:(?:the|my|front|rear|back|side) )*(?:{_PARTS})\b",
+    re.IGNORECASE,
+)
+
+PHOTOS = re.compile(
+    r"\b(?P<no>no|don'?t have|didn'?t take|haven'?t taken) (?:any )?(?:photos|pictures|pics)\b"
+    r"|\b(?P<yes>took|taken|have|got|snapped) (?:some |a few |several )?(?:photos|pictures|pics)\b",
+    re.IGNORECASE,
+)
+
+SAFE = re.compile(
+    r"\b(?P<no>not safe|unsafe|in (?:the )?traffic|blocking (?:a |the )?lane|in danger)\b"
+    r"|\b(?P<yes>(?:i'?m|i am|we'?re|we are) safe|safe (?:place|spot|location)|pulled (?:over|off)|off the road)\b",
+    re.IGNORECASE,
+)
+
+VEHICLE_ISSUE = re.compile(
+    r"\b(flat tire|blown tire|tire blew out|won'?t start|dead battery|battery (?:is )?dead|battery died"
+    r"|locked (?:my |the )?keys|keys locked|out of gas|ran out of gas|overheat(?:ed|ing)"
+    r"|stuck in (?:a |the )?(?:ditch|mud|snow)|broke down|engine (?:died|stalled))\b",
+    re.IGNORECASE,
+)
+
+POLICY_NUMBER = re.compile(r"\b[A-Za-z]{2,4}-?\d{5,10}\b|\b\d{6,12}\b")
+
+
+def _span(pattern):
+    def extract(text):
+        match = pattern.search(text)
+        return match.group(0).strip() if match else None
+    return extract
+
+
+def _spans(pattern, max_gap=2):
+    """Like _span, but runs of adjacent matches ("yesterday at 5pm") come back as one value"""
+    def extract(text):
+        matches = list(pattern.finditer(text))
+        if not matches:
+            return None
+        start, end = matches[0].span()
+        for match in matches[1:]:
+            if match.start() - end > max_gap:
+                break
+            end = match.end()
+        return text[start:end].strip()
+    return extract
+
+
+def _yes_no(pattern):
+    def extract(text):
+        match = pattern.search(text)
+        if not match:
+            return None
+        return "yes" if match.group("yes") else "no"
+    return extract
+
+
+# Extractor name -> text -> value or None. Flow steps opt in with "extract": <name>.
+EXTRACTORS = {
+    "when": _spans(WHEN),
+    "where": _span(WHERE),
+    "damage": _span(DAMAGE),
+    "photos": _yes_no(PHOTOS),
+    "safe": _yes_no(SAFE),
+    "vehicle_issue": _span(VEHICLE_ISSUE),
+}
+
+
+def extract_slots(text, names=EXTRACTORS):
+    """Run the named extractors over one utterance; returns {name: value} for those that matched"""
+    found = {}
+    for name in names:
+        value = EXTRACTORS[name](text)
+        if value is not None:
+            found[name] = value
+    return found
+
+
+def extract_policy_number(text):
+    """The first policy-number-looking token, or None"""
+    match = POLICY_NUMBER.search(text)
+    return match.group(0) if match else None
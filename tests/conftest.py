@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def kb():
+    """The shipped articles with the hashing embedder and no on-disk cache"""
+    from knowledge_base import KnowledgeBase
+    from retrieval import HashingEmbedder
+
+    return KnowledgeBase(os.path.join(ROOT, "kb"), embedder=HashingEmbedder(), use_cache=False)
@@ -0,0 +1,71 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from conftest import ROOT
+
+
+@pytest.fixture(scope="module")
+def app():
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    os.environ.setdefault("IVR_KB_RELOAD_INTERVAL", "0")
+    try:
+        import api
+        yield api.create_app()
+    finally:
+        os.chdir(cwd)
+
+
+def test_turns_for_one_session_are_serialized_off_the_loop(app):
+    get = app.store.get
+
+    def slow_get(session_id):
+        time.sleep(0.1)
+        return get(session_id)
+
+    async def run():
+        session_id = (await app.turn({"caller": "+15550001"}))["session_id"]
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        app.store.get = slow_get
+        try:
+            first, second = await asyncio.gather(
+                app.turn({"session_id": session_id, "utterance": "POL123456"}),
+                app.turn({"session_id": session_id, "utterance": "3"}))
+        finally:
+            app.store.get = get
+            ticker.cancel()
+        return first, second, ticks
+
+    first, second, ticks = asyncio.run(run())
+    assert first["step"] == "intent_selection"
+    assert second["step"] == "roadside_description"
+    assert second["handoff"]["verified"] is True
+    # The loop kept running while both store reads slept
+    assert ticks >= 10
+    assert app._locks == {}
+
+
+def test_batch_reports_each_failure_in_its_slot(app):
+    async def run():
+        session_id = (await app.turn({}))["session_id"]
+        return await app.batch({"turns": [
+            {"session_id": session_id, "utterance": "POL123456"},
+            {"session_id": 5},
+            {"session_id": "CALL-unknown", "utterance": "hi"},
+        ]})
+
+    results = asyncio.run(run())["results"]
+    assert results[0]["step"] == "intent_selection"
+    assert results[1] == {"error": "session_id must be a string", "status": 400}
+    assert results[2]["status"] == 404
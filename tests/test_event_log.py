@@ -0,0 +1,82 @@
+import os
+
+from dialog import DialogEngine
+from event_log import (DETAIL, MESSAGE, START, UPDATE, EventLog, encode_event, list_segments,
+                       read_events, read_segment, replay)
+from session import CallSession
+
+
+def _segment(log_dir):
+    return os.path.join(log_dir, list_segments(log_dir)[-1])
+
+
+def test_frame_round_trip(tmp_path):
+    path = tmp_path / "events-00000000.log"
+    frames = [
+        encode_event(START, "CALL-1", b"", timestamp=1.5),
+        encode_event(MESSAGE, "CALL-1", b"\x00hello", timestamp=2.5),
+        encode_event(UPDATE, "CALL-2", b"\x06intent\"billing\"", timestamp=3.5),
+    ]
+    path.write_bytes(b"".join(frames))
+
+    events = [(kind, ts, sid, bytes(body)) for kind, ts, sid, body in read_segment(str(path))]
+    assert events == [
+        (START, 1.5, "CALL-1", b""),
+        (MESSAGE, 2.5, "CALL-1", b"\x00hello"),
+        (UPDATE, 3.5, "CALL-2", b"\x06intent\"billing\""),
+    ]
+    only_one = [sid for _, _, sid, _ in read_segment(str(path), "CALL-2")]
+    assert only_one == ["CALL-2"]
+
+
+def test_torn_tail_is_truncated_on_reopen(tmp_path):
+    log_dir = str(tmp_path)
+    log = EventLog(log_dir)
+    log.record_start("CALL-1")
+    log.record_update("CALL-1", "intent", "roadside")
+    log.close()
+    intact = os.path.getsize(_segment(log_dir))
+
+    torn = encode_event(DETAIL, "CALL-1", b"\x05wherenowhere")
+    with open(_segment(log_dir), "ab") as f:
+        f.write(torn[:len(torn) - 3])
+    assert [kind for kind, *_ in read_events(log_dir)] == [START, UPDATE]
+
+    log = EventLog(log_dir)
+    assert os.path.getsize(_segment(log_dir)) == intact
+    log.record_step("CALL-1", "Pulled over")
+    log.close()
+    assert len(list(read_events(log_dir))) == 3
+
+
+def test_corrupt_frame_stops_reading(tmp_path):
+    log_dir = str(tmp_path)
+    log = EventLog(log_dir)
+    log.record_start("CALL-1")
+    log.record_doc("CALL-1", "billing-payment.md")
+    log.close()
+
+    data = bytearray(open(_segment(log_dir), "rb").read())
+    data[-1] ^= 0xFF
+    open(_segment(log_dir), "wb").write(bytes(data))
+    assert [kind for kind, *_ in read_events(log_dir)] == [START]
+
+
+def test_replay_matches_live_session(tmp_path, kb):
+    log = EventLog(str(tmp_path))
+    engine = DialogEngine(kb, CallSession, event_log=log, scorer=False)
+    answers = {"verification": "POL123456", "intent_selection": "3",
+               "roadside_description": "My car won't start", "roadside_location": "I-280 near exit 12",
+               "roadside_issue": "Dead battery", "roadside_safety": "No, I'm in traffic", "final_choice": "2"}
+    session_state = engine.new_state()
+    while session_state["step"] != "complete":
+        engine.advance(session_state, answers[session_state["step"]])
+    live = session_state["session"]
+    log.close()
+
+    replayed = replay(str(tmp_path), live.session_id)
+    assert replayed.generate_handoff_summary() == live.generate_handoff_summary()
+    assert replayed.conversation_history == live.conversation_history
+    assert replayed.incident_details == live.incident_details
+    assert replayed.sentiment == "urgent"
+    assert replay(str(tmp_path), "CALL-unknown") is None
@@ -0,0 +1,24 @@
+import asyncio
+
+from intent_classifier import IntentClassifier
+
+
+def test_classify_counts_each_lookup_once():
+    classifier = IntentClassifier()
+    assert classifier.classify("my car won't start") == "roadside"
+    assert classifier.classify("My car won't start!") == "roadside"
+    assert classifier.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_classify_async_counts_a_batched_miss_once():
+    classifier = IntentClassifier()
+
+    async def run():
+        return await asyncio.gather(classifier.classify_async("I need to pay my bill"),
+                                    classifier.classify_async("someone hit my car"))
+
+    assert asyncio.run(run()) == ["billing", "file_claim"]
+    assert classifier.stats()["misses"] == 2
+    assert classifier.stats()["hits"] == 0
+    assert asyncio.run(classifier.classify_async("I need to pay my bill")) == "billing"
+    assert classifier.stats()["hits"] == 1
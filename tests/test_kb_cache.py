@@ -0,0 +1,61 @@
+import builtins
+import os
+import shutil
+
+import numpy as np
+
+from conftest import ROOT
+from kb_cache import EmbeddingCache
+from kb_corpus import Corpus
+from retrieval import HashingEmbedder, VectorIndex
+
+
+def _kb_copy(tmp_path):
+    kb_dir = tmp_path / "kb"
+    shutil.copytree(os.path.join(ROOT, "kb"), kb_dir)
+    return str(kb_dir)
+
+
+def _assert_matches_files(kb_dir, corpus, chunks, matrix, embedder):
+    expected = Corpus.from_files(kb_dir)
+    assert chunks == expected.chunks
+    assert dict(corpus) == dict(expected)
+    index = VectorIndex(embedder)
+    index.build(expected)
+    assert np.allclose(matrix, index.matrix)
+
+
+def test_warm_start_reads_no_articles(tmp_path, monkeypatch):
+    kb_dir = _kb_copy(tmp_path)
+    embedder = HashingEmbedder()
+    cache = EmbeddingCache(kb_dir, cache_dir=str(tmp_path / "cache"))
+    cache.load(embedder)
+
+    opened = []
+    real_open = builtins.open
+    monkeypatch.setattr(builtins, "open", lambda path, *args, **kwargs:
+                        opened.append(str(path)) or real_open(path, *args, **kwargs))
+    corpus, chunks, matrix = cache.load(embedder)
+    monkeypatch.undo()
+
+    assert not [path for path in opened if path.endswith(".md")]
+    assert cache.last_stats == {"reused": 3, "embedded": 0, "removed": 0}
+    _assert_matches_files(kb_dir, corpus, chunks, matrix, embedder)
+
+
+def test_edited_and_removed_articles_shift_the_rest(tmp_path):
+    kb_dir = _kb_copy(tmp_path)
+    embedder = HashingEmbedder()
+    cache = EmbeddingCache(kb_dir, cache_dir=str(tmp_path / "cache"))
+    cache.load(embedder)
+
+    with open(os.path.join(kb_dir, "billing-payment.md"), "a") as f:
+        f.write("\n## Autopay\nSet up autopay from your online account.\n")
+    corpus, chunks, matrix = cache.load(embedder)
+    assert cache.last_stats == {"reused": 2, "embedded": 1, "removed": 0}
+    _assert_matches_files(kb_dir, corpus, chunks, matrix, embedder)
+
+    os.remove(os.path.join(kb_dir, "claim-filing.md"))
+    corpus, chunks, matrix = cache.load(embedder)
+    assert cache.last_stats == {"reused": 2, "embedded": 0, "removed": 1}
+    _assert_matches_files(kb_dir, corpus, chunks, matrix, embedder)
@@ -0,0 +1,55 @@
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+
+from dialog import DialogEngine
+from intent_classifier import IntentClassifier
+from knowledge_base import KnowledgeBase
+from retrieval import HashingEmbedder, SentenceTransformerEmbedder
+from session import CallSession
+
+
+def test_missing_kb_dir_retrieves_nothing(tmp_path):
+    kb = KnowledgeBase(str(tmp_path / "missing"), embedder=HashingEmbedder(), use_cache=False)
+    assert len(kb.docs) == 0
+    assert kb.retrieve("file_claim", "1") is None
+    assert kb.retrieve(None, "my car won't start") is None
+    assert kb.search("flat tire") == []
+
+
+def test_missing_kb_dir_keeps_the_call_going(tmp_path):
+    kb = KnowledgeBase(str(tmp_path / "missing"), embedder=HashingEmbedder(), use_cache=False)
+    engine = DialogEngine(kb, CallSession, classifier=IntentClassifier(), scorer=False)
+    state = engine.new_state()
+    engine.advance(state, "POL123456")
+    reply = engine.advance(state, "1")
+    assert state["session"].intent == "file_claim"
+    assert "what happened" in reply
+
+
+def test_concurrent_first_encodes_load_one_model(monkeypatch):
+    loads = []
+
+    class FakeModel:
+        def __init__(self, name):
+            loads.append(name)
+            time.sleep(0.05)
+
+        def get_sentence_embedding_dimension(self):
+            return 4
+
+        def encode(self, texts, **kwargs):
+            return np.ones((len(texts), 4), dtype=np.float32)
+
+    monkeypatch.setitem(sys.modules, "sentence_transformers",
+                        types.SimpleNamespace(SentenceTransformer=FakeModel))
+    embedder = SentenceTransformerEmbedder("fake-model")
+    threads = [threading.Thread(target=embedder.encode, args=(["flat tire"],)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loads == ["fake-model"]
@@ -0,0 +1,33 @@
+import metrics
+from metrics import Metrics, NullMetrics, metrics_from_env
+
+
+def test_render_counters_and_histograms():
+    m = Metrics()
+    m.inc("turns_total", step="verify")
+    m.observe("step_seconds", 0.003, step="verify")
+    text = m.render()
+    assert 'ivr_turns_total{step="verify"} 1' in text
+    assert 'ivr_step_seconds_bucket{step="verify",le="0.005"} 1' in text
+    assert 'ivr_step_seconds_count{step="verify"} 1' in text
+
+
+def test_metrics_off_without_env(monkeypatch):
+    monkeypatch.delenv("IVR_METRICS_PORT", raising=False)
+    monkeypatch.delenv("IVR_METRICS_FILE", raising=False)
+    assert isinstance(metrics_from_env(), NullMetrics)
+
+
+def test_each_worker_gets_its_own_port_file_and_label(monkeypatch):
+    started = {}
+    monkeypatch.setattr(metrics, "start_http_server", lambda m, port: started.setdefault("port", port))
+    monkeypatch.setattr(metrics, "start_periodic_dump",
+                        lambda m, path, interval: started.setdefault("path", path))
+    monkeypatch.setenv("IVR_METRICS_PORT", "9100")
+    monkeypatch.setenv("IVR_METRICS_FILE", "/var/lib/ivr/metrics.prom")
+    monkeypatch.setenv("IVR_WORKER_ID", "3")
+
+    m = metrics_from_env()
+    m.inc("turns_total")
+    assert started == {"port": 9103, "path": "/var/lib/ivr/metrics-worker-3.prom"}
+    assert 'ivr_turns_total{worker="3"} 1' in m.render()
@@ -0,0 +1,90 @@
+import os
+
+from policy_index import PolicyIndex, PolicyVerifier, build_index, normalize_policy
+
+
+POLICIES = ["POL123456", "pol-654321", "  ABC 0001  ", "GEICO998877"]
+
+
+def _index(tmp_path, policies=POLICIES, **kwargs):
+    path = str(tmp_path / "policies.idx")
+    build_index(policies, path, **kwargs)
+    return path
+
+
+def test_normalize_policy():
+    assert normalize_policy("pol-123 456") == b"POL123456".ljust(16, b"\0")
+    assert normalize_policy("---") is None
+    assert normalize_policy("X" * 17) is None
+
+
+def test_build_and_lookup(tmp_path):
+    index = PolicyIndex(_index(tmp_path, POLICIES + ["POL123456"]))
+    assert len(index) == 4
+    for policy in ("POL123456", "pol 123-456", "POL654321", "abc0001", "GEICO998877"):
+        assert index.lookup(policy) == "present"
+    assert "POL000000" not in index
+    assert index.lookup("") == "absent"
+    assert not os.path.exists(str(tmp_path / "policies.idx.tmp"))
+
+
+def test_empty_index(tmp_path):
+    index = PolicyIndex(_index(tmp_path, []))
+    assert len(index) == 0
+    assert index.lookup("POL123456") == "absent"
+
+
+def test_bloom_false_positive_is_missing(tmp_path):
+    # One bit per key: the filter passes plenty of unknown numbers through to the key search
+    policies = [f"POL{n:06d}" for n in range(0, 20000, 2)]
+    index = PolicyIndex(_index(tmp_path, policies, bits_per_key=1))
+    candidates = (f"POL{n:06d}" for n in range(1, 20000, 2))
+    false_positive = next(p for p in candidates if index.might_contain(normalize_policy(p)))
+    assert index.lookup(false_positive) == "missing"
+    assert all(index.lookup(p) == "present" for p in policies[:100])
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_verifier_limits_failures_per_caller(tmp_path):
+    clock = FakeClock()
+    verifier = PolicyVerifier(_index(tmp_path), max_attempts=3, window=60.0, clock=clock)
+
+    assert verifier.verify("POL123456", "+15550001") == "present"
+    assert [verifier.verify("POL00000%d" % i, "+15550001") for i in range(4)] == \
+        ["absent", "absent", "absent", "rate_limited"]
+    # Other lines, and the policyholder's own number, are unaffected
+    assert verifier.verify("POL123456", "+15550002") == "present"
+    assert verifier.verify("POL000009", None) == "absent"
+
+    clock.now = 61.0
+    assert verifier.verify("POL123456", "+15550001") == "present"
+
+
+def test_verifier_shares_one_bucket_without_caller(tmp_path):
+    clock = FakeClock()
+    verifier = PolicyVerifier(_index(tmp_path), max_attempts=3, window=60.0, shared_attempts=2,
+                              clock=clock)
+
+    assert [verifier.verify("POL00000%d" % i, None) for i in range(3)] == \
+        ["absent", "absent", "rate_limited"]
+    assert verifier.verify("POL123456", None) == "rate_limited"
+    # Callers with a known line keep their own budget
+    assert verifier.verify("POL123456", "+15550001") == "present"
+
+
+def test_verifier_refresh_swaps_in_rebuilt_index(tmp_path):
+    path = _index(tmp_path)
+    verifier = PolicyVerifier(path)
+    assert verifier.verify("POL777777") == "absent"
+    assert not verifier.refresh()
+
+    build_index(POLICIES + ["POL777777"], path)
+    assert verifier.refresh()
+    assert verifier.verify("POL777777") == "present"
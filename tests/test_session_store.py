@@ -0,0 +1,100 @@
+import pytest
+
+import session_store
+from session import CallSession
+from session_store import MemoryBackend, SessionStore, SQLiteBackend, decode_state, encode_state
+
+
+class FakeTime:
+    now = 1_000_000.0
+
+    @classmethod
+    def time(cls):
+        return cls.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    monkeypatch.setattr(session_store, "time", FakeTime)
+    FakeTime.now = 1_000_000.0
+    return FakeTime
+
+
+def _session_state(step="claim_where"):
+    session = CallSession()
+    session.update("intent", "file_claim")
+    session.update("issue_description", "Rear-ended at a light")
+    session.set_detail("when", "yesterday")
+    session.add_step("Took photos of damage")
+    session.add_retrieved_doc("claim-filing.md")
+    session.add_message("assistant", "Please enter your policy number:")
+    session.add_message("user", "POL123456")
+    return {"session": session, "step": step, "intent_details": {}, "prefill": {"claim_where": "on Elm Street"}}
+
+
+def test_encode_decode_round_trip():
+    state = _session_state()
+    decoded = decode_state(encode_state(state))
+    session, original = decoded["session"], state["session"]
+
+    assert decoded["step"] == "claim_where"
+    assert decoded["prefill"] == {"claim_where": "on Elm Street"}
+    assert session.session_id == original.session_id
+    assert session.conversation_history == original.conversation_history
+    assert session.incident_details == {"when": "yesterday"}
+    assert session.generate_handoff_summary() == original.generate_handoff_summary()
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_ttl_expiry(tmp_path, clock, backend):
+    backend = MemoryBackend() if backend == "memory" else SQLiteBackend(str(tmp_path / "sessions.db"))
+    store = SessionStore(backend, ttl=60)
+    session_id = store.put(_session_state())
+    assert store.flush() == 1
+    assert store.get(session_id)["step"] == "claim_where"
+
+    clock.now += 61
+    assert store.purge_expired() == 1
+    assert store.get(session_id) is None
+    store.close()
+
+
+class FlakyBackend(MemoryBackend):
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def save_many(self, items):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+        super().save_many(items)
+
+
+def test_failed_flush_is_retried_without_clobbering_newer_writes(clock):
+    backend = FlakyBackend(failures=1)
+    store = SessionStore(backend)
+    first, second = _session_state("claim_where"), _session_state("claim_damage")
+    store.put(first)
+    store.put(second)
+
+    with pytest.raises(OSError):
+        store.flush()
+    # Still readable from the pending copy, and a newer write made meanwhile wins
+    first["step"] = "claim_photos"
+    store.put(first)
+    assert store.get(first["session"].session_id)["step"] == "claim_photos"
+
+    assert store.flush() == 2
+    store.pending.clear()
+    assert store.get(first["session"].session_id)["step"] == "claim_photos"
+    assert store.get(second["session"].session_id)["step"] == "claim_damage"
+
+
+def test_put_flushes_inline_without_a_flusher(clock):
+    backend = MemoryBackend()
+    store = SessionStore(backend, batch_size=2)
+    store.put(_session_state())
+    assert not backend.entries
+    store.put(_session_state())
+    assert len(backend.entries) == 2
@@ -0,0 +1,120 @@
+import pytest
+
+from dialog import DialogEngine
+from intent_classifier import IntentClassifier
+from session import CallSession
+from slots import EXTRACTORS, extract_policy_number, extract_slots
+
+
+@pytest.mark.parametrize("name, text, expected", [
+    ("when", "yesterday at 5pm", "yesterday at 5pm"),
+    ("when", "it happened last night around 11 pm", "last night around 11 pm"),
+    ("when", "2 hours ago", "2 hours ago"),
+    ("when", "nothing to report", None),
+    ("where", "on Highway 101 in San Jose", "on Highway 101 in San Jose"),
+    ("where", "at the intersection of Main and 5th", "at the intersection of Main and 5th"),
+    ("where", "in the Target parking lot", "in the Target parking lot"),
+    ("where", "on Monday", None),
+    ("where", "I don't know", None),
+    ("damage", "rear bumper crumpled", "rear bumper crumpled"),
+    ("damage", "the driver's door was dented", "driver's door was dented"),
+    ("damage", "cracked windshield", "cracked windshield"),
+    ("damage", "it's fine", None),
+    ("photos", "I took some photos", "yes"),
+    ("photos", "I don't have any pictures", "no"),
+    ("photos", "maybe", None),
+    ("safe", "I'm pulled over on the shoulder", "yes"),
+    ("safe", "not safe, I'm in traffic", "no"),
+    ("safe", "hmm", None),
+    ("vehicle_issue", "my car won't start", "won't start"),
+    ("vehicle_issue", "tire blew out on the freeway", "tire blew out"),
+    ("vehicle_issue", "ok", None),
+])
+def test_extractors(name, text, expected):
+    assert EXTRACTORS[name](text) == expected
+
+
+def test_extract_slots_returns_only_matches():
+    found = extract_slots("rear-ended this morning on Highway 101, bumper crumpled")
+    assert found == {"when": "this morning", "where": "on Highway 101", "damage": "bumper crumpled"}
+    assert extract_slots("hello", ["when", "where"]) == {}
+
+
+def test_extract_policy_number():
+    assert extract_policy_number("my number is POL-1234567 thanks") == "POL-1234567"
+    assert extract_policy_number("it's 12345678") == "12345678"
+    assert extract_policy_number("12") is None
+
+
+@pytest.fixture
+def engine(kb):
+    return DialogEngine(kb, CallSession, classifier=IntentClassifier(), scorer=False)
+
+
+def test_free_text_answer_skips_answered_questions(engine):
+    session_state = engine.new_state()
+    for message in ["POL123456", "1", "Someone backed into me yesterday at 5pm on Elm Street"]:
+        engine.advance(session_state, message)
+    assert session_state["step"] == "claim_damage"
+    assert session_state["session"].incident_details == {
+        "when": "yesterday at 5pm", "where": "on Elm Street"}
+
+
+def test_classified_menu_answer_is_the_issue_description(engine):
+    session_state = engine.new_state()
+    engine.advance(session_state, "POL123456")
+    reply = engine.advance(session_state, "rear-ended this morning on Highway 101, bumper crumpled")
+    session = session_state["session"]
+    assert session.intent == "file_claim"
+    assert session.issue_description == "rear-ended this morning on Highway 101, bumper crumpled"
+    assert session_state["step"] == "claim_photos"
+    assert engine.steps["claim_description"].prompt not in reply
+
+
+def test_menu_digit_does_not_prefill(engine):
+    session_state = engine.new_state()
+    engine.advance(session_state, "POL123456")
+    engine.advance(session_state, "1")
+    assert session_state["step"] == "claim_description"
+    assert session_state["session"].issue_description == ""
+
+
+def test_words_after_an_early_reply_fill_later_slots(engine):
+    session_state = engine.new_state()
+    for message in ["POL123456", "1", "I was rear-ended"]:
+        engine.advance(session_state, message)
+    events = list(engine.advance_stream(session_state, [
+        "yesterday", "yesterday at 5pm on", "yesterday at 5pm on Highway 101 in San Jose"]))
+    replies = [event for event in events if event["type"] == "reply"]
+    assert [event["early"] for event in replies] == [True, False]
+    assert session_state["step"] == "claim_damage"
+    assert session_state["session"].incident_details["where"] == "on Highway 101 in San Jose"
+
+
+def _at_roadside_safety(engine):
+    session_state = engine.new_state()
+    for message in ["POL123456", "3", "I'm stuck", "on I-5 near exit 12", "flat tire"]:
+        engine.advance(session_state, message)
+    assert session_state["step"] == "roadside_safety"
+    return session_state
+
+
+def test_final_transcript_revises_an_early_yes_no(engine):
+    session_state = _at_roadside_safety(engine)
+    events = list(engine.advance_stream(session_state, ["No", "Now I'm safe, pulled over on the shoulder"]))
+    session = session_state["session"]
+    assert [event["early"] for event in events if event["type"] == "reply"] == [True, False]
+    assert session.incident_details["safe"] == "yes"
+    assert session.sentiment == "neutral"
+    assert session_state["step"] == "final_choice"
+    assert session.last_user_message == "Now I'm safe, pulled over on the shoulder"
+
+
+def test_final_transcript_agreeing_with_early_reply_is_kept(engine):
+    session_state = _at_roadside_safety(engine)
+    events = list(engine.advance_stream(session_state, ["No", "No, I'm in traffic"]))
+    session = session_state["session"]
+    assert [event["type"] for event in events] == ["reply"]
+    assert session.incident_details["safe"] == "no"
+    assert session.sentiment == "urgent"
+    assert session.last_user_message == "No, I'm in traffic"